@@ -0,0 +1,467 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from catalog import CatalogIndex, GameRecord
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASELINE_FILE = os.path.join(FIXTURES_DIR, 'benchmark_baseline.json')
+HOSTS = ['gofile.io/d', 'megadb.net', 'pixeldrain.com/u', 'buzzheavier.com', 'datanodes.to']
+# Raw date strings in the shapes extract_game_details hands to parse_date
+DATE_STRINGS = ['2024-12-23T14:10:05+00:00', 'December 23, 2024', 'March 8, 2024', '2023-11-02',
+                'Posted on 5 Oct 2024', 'not a date', '2024-07-14T00:00:00Z', 'July 14, 2024']
+STAGES = ['merge', 'memory', 'search', 'parse', 'list', 'dates', 'save', 'split', 'startup']
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hydrasteam.py')
+# The scraping stack; the cheap hydrasteam.py subcommands must start without it
+HEAVY_MODULES = {'requests', 'bs4', 'dateutil', 'lxml', 'selectolax', 'tqdm'}
+# Title words for the search stage, so titles share words the way real ones do
+TITLE_WORDS = ['dark', 'souls', 'elden', 'ring', 'grand', 'theft', 'auto', 'witcher', 'wild', 'hunt', 'cyber', 'punk',
+               'hollow', 'knight', 'spider', 'man', 'legend', 'kingdom', 'racing', 'simulator', 'farm', 'city',
+               'skylines', 'dead', 'space', 'resident', 'evil', 'final', 'fantasy', 'tales', 'arise', 'stardew',
+               'valley', 'portal', 'half', 'life', 'total', 'war', 'warhammer', 'age', 'empires', 'civilization']
+
+
+def make_synthetic_games(count, seed=0):
+    """Generate a deterministic synthetic catalog in the hydrasteam.json schema."""
+    rng = random.Random(seed)
+    games = []
+    for i in range(count):
+        suffix = rng.choice(['', f' (v1.{i % 17}.{i % 5})', f' (Build {1000000 + i})'])
+        games.append({
+            'title': f"Synthetic Game {i}{suffix}",
+            'fileSize': f"{rng.randint(1, 900) / 10} GB",
+            'uploadDate': f"20{rng.randint(18, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'uris': [f"https://{host}/{i:x}{j}" for j, host in enumerate(rng.sample(HOSTS, rng.randint(1, 3)))]
+        })
+    return games
+
+
+def make_scraped_batch(games, count, seed=1):
+    """Simulate one refresh: mostly unchanged pages, some updates and some new games."""
+    rng = random.Random(seed)
+    batch = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.8:
+            batch.append(dict(rng.choice(games)))
+        elif roll < 0.9:
+            updated = dict(rng.choice(games))
+            updated['fileSize'] = '1.0 GB'
+            batch.append(updated)
+        else:
+            batch.append({'title': f"New Synthetic Game {i}", 'fileSize': '1 GB',
+                          'uploadDate': '2025-01-01', 'uris': ['https://gofile.io/d/new']})
+    return batch
+
+
+def legacy_merge(all_downloads, game_data):
+    """The linear title scan main() used before CatalogIndex (kept for comparison)."""
+    game_title_lower = game_data.get('title', '').strip().lower()
+    for i, existing_game in enumerate(all_downloads):
+        if existing_game.get('title', '').lower() == game_title_lower:
+            if existing_game != game_data:
+                all_downloads[i] = game_data
+            return
+    all_downloads.append(game_data)
+
+
+def load_fixture_pages(fixtures_dir=FIXTURES_DIR):
+    """Return (filename, url, html bytes, expected record) for every saved game page."""
+    with open(os.path.join(fixtures_dir, 'expected.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    pages = []
+    for filename, entry in sorted(expected.items()):
+        with open(os.path.join(fixtures_dir, 'pages', filename), 'rb') as f:
+            pages.append((filename, entry['url'], f.read(), entry['expected']))
+    return pages
+
+
+def load_list_fixture(fixtures_dir=FIXTURES_DIR):
+    """Return (html bytes, expected game links) for the saved game list page."""
+    with open(os.path.join(fixtures_dir, 'list_expected.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    with open(os.path.join(fixtures_dir, expected['file']), 'rb') as f:
+        return f.read(), expected['links']
+
+
+@contextlib.contextmanager
+def quiet():
+    """Drop what the measured code prints or logs, so the timings leave that I/O out."""
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def measure(func, repeat=1):
+    """
+    Run func repeat times and return (best wall time in seconds, peak traced bytes).
+    Timing runs without tracemalloc; one extra traced run measures peak memory.
+    """
+    timings = []
+    with quiet():
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+class Report:
+    """Collects per-stage results and compares them with a saved baseline."""
+
+    def __init__(self):
+        self.results = {}
+        self.failures = []
+
+    def add(self, name, seconds, peak_bytes, per=None, unit='run', retained_bytes=None):
+        self.results[name] = {'seconds': seconds, 'peak_bytes': peak_bytes}
+        per_text = f" | {seconds / per * 1e6:9.2f} us/{unit}" if per else ''
+        if retained_bytes is not None:
+            self.results[name]['retained_bytes'] = retained_bytes
+            per_text += f" | kept {retained_bytes / 1048576:8.2f} MiB" + (f" ({retained_bytes / per:.0f} B/{unit})" if per else '')
+        print(f"  {name:<28} {seconds * 1000:10.2f} ms | peak {peak_bytes / 1048576:8.2f} MiB{per_text}")
+
+    def fail(self, message):
+        self.failures.append(message)
+        print(f"  FAIL: {message}")
+
+    def compare(self, baseline, threshold, min_seconds):
+        print(f"\nRegression check (threshold +{threshold:.0%})")
+        for name, result in sorted(self.results.items()):
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            for metric, floor in (('seconds', min_seconds), ('peak_bytes', 1024 * 1024), ('retained_bytes', 1024 * 1024)):
+                if metric not in previous or metric not in result:
+                    continue
+                old, new = previous[metric], result[metric]
+                # Ignore tiny absolute differences, which are mostly timer noise
+                if new > old * (1 + threshold) and new - old > floor:
+                    self.fail(f"{name} {metric} regressed: {old:.4g} -> {new:.4g}")
+        if not self.failures:
+            print("  No regressions.")
+
+
+def bench_merge(report, sizes, batch_size, legacy=False):
+    print(f"\nmerge: CatalogIndex build and upserts ({batch_size} scraped games per refresh)")
+    for size in sizes:
+        games = make_synthetic_games(size)
+        batch = make_scraped_batch(games, batch_size)
+
+        seconds, peak = measure(lambda: CatalogIndex(games))
+        report.add(f"merge.build.{size}", seconds, peak, per=size, unit='game')
+
+        # Only the upserts are timed, on a fresh index each run
+        timings = []
+        for _ in range(3):
+            index = CatalogIndex(games)
+            start = time.perf_counter()
+            for game_data in batch:
+                index.upsert(game_data)
+            timings.append(time.perf_counter() - start)
+        report.add(f"merge.upsert.{size}", min(timings), 0, per=batch_size, unit='game')
+
+        if legacy:
+            def legacy_refresh():
+                all_downloads = list(games)
+                for game_data in batch:
+                    legacy_merge(all_downloads, game_data)
+            seconds, _ = measure(legacy_refresh)
+            report.add(f"merge.legacy.{size}", seconds, 0, per=batch_size, unit='game')
+
+
+def measure_retained(build):
+    """Build something and return (wall time, peak traced bytes, traced bytes still held by the result)."""
+    gc.collect()
+    start = time.perf_counter()
+    tracemalloc.start()
+    try:
+        with quiet():
+            kept = build()
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = time.perf_counter() - start
+    del kept
+    return seconds, peak, retained
+
+
+def bench_memory(report, sizes):
+    """
+    Memory held by a catalog loaded from a feed: the plain dicts json.load returns,
+    the same games as GameRecords, and a full CatalogIndex of them.
+    Loading from JSON text matters: every decoded value is its own string object.
+    """
+    print("\nmemory: in-memory catalog, JSON dicts vs GameRecords (times include tracing)")
+    for size in sizes:
+        data = json.dumps(make_synthetic_games(size))
+        seconds, peak, retained = measure_retained(lambda: json.loads(data))
+        report.add(f"memory.dicts.{size}", seconds, peak, per=size, unit='game', retained_bytes=retained)
+        seconds, peak, retained = measure_retained(lambda: [GameRecord.from_dict(game) for game in json.loads(data)])
+        report.add(f"memory.records.{size}", seconds, peak, per=size, unit='game', retained_bytes=retained)
+        seconds, peak, retained = measure_retained(lambda: CatalogIndex(json.loads(data)))
+        report.add(f"memory.index.{size}", seconds, peak, per=size, unit='game', retained_bytes=retained)
+
+
+def make_titled_games(count, seed=0):
+    """
+    Synthetic games titled like real ones: 1-3 common TITLE_WORDS, a made-up name
+    and a number, with an occasional version suffix.
+    """
+    rng = random.Random(seed)
+    syllables = ['ka', 'ro', 'mi', 'zen', 'tor', 'vel', 'dra', 'nox', 'lu', 'shi', 'bar', 'qua', 'fen', 'yth', 'gor']
+    games = make_synthetic_games(count, seed)
+    for i, game in enumerate(games):
+        words = [word.capitalize() for word in rng.sample(TITLE_WORDS, rng.randint(1, 3))]
+        words.insert(rng.randrange(len(words) + 1), ''.join(rng.sample(syllables, rng.randint(2, 3))).capitalize())
+        game['title'] = f"{' '.join(words)} {i}" + rng.choice(['', f" (v1.{i % 9})"])
+    return games
+
+
+def bench_search(report, sizes, queries=200):
+    from search import SearchIndex
+
+    print(f"\nsearch: SearchIndex build, load, incremental update and lookups ({queries} queries each)")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            games = make_titled_games(size)
+            path = os.path.join(tmp_dir, f"search_{size}.json")
+            seconds, peak = measure(lambda: SearchIndex(path).update(games))
+            report.add(f"search.build.{size}", seconds, peak, per=size, unit='game')
+            index = SearchIndex(path)
+            index.update(games)
+            index.save()
+            seconds, peak = measure(lambda: SearchIndex.load(path))
+            report.add(f"search.load.{size}", seconds, peak, per=size, unit='game')
+
+            # A typical refresh: 1% of the games updated, renamed (version bump) or added, a few removed
+            rng = random.Random(2)
+            changed = [dict(game) for game in games]
+            for game in rng.sample(changed, max(1, size // 100)):
+                game['fileSize'] = '1 GB'
+            for game in rng.sample(changed, max(1, size // 100)):
+                game['title'] += ' (v9.9)'
+            del changed[:max(1, size // 1000)]
+            changed += make_titled_games(max(1, size // 100), seed=3)[:max(1, size // 100)]
+            for game in changed[-max(1, size // 100):]:
+                game['title'] = 'New ' + game['title']
+            seconds, _ = measure(lambda: SearchIndex.load(path).update(changed))
+            report.add(f"search.update.{size}", seconds, 0, per=len(changed), unit='game')
+
+            # Queries for random games: the start of the title, two of its words backwards, and those words mistyped
+            titles = [index.keys[slot] for slot in rng.sample(range(len(index.keys)), queries)]
+            words = [' '.join(title.split()[1::-1]) for title in titles]
+            typos = [' '.join(word[:2] + word[3:] if len(word) > 4 else word for word in query.split()) for query in words]
+            for mode, texts in (('prefix', [title[:8] for title in titles]), ('words', words), ('fuzzy', typos)):
+                lookup = getattr(index, mode)
+                seconds, _ = measure(lambda: [lookup(text, 20) for text in texts], repeat=3)
+                report.add(f"search.{mode}.{size}", seconds, 0, per=queries, unit='query')
+
+
+def bench_parse(report, repeat, parsers=None):
+    """
+    Check parse_game_html against the fixture corpus for every parser backend
+    (full and scoped parsing) and time it per page.
+    Only a mismatch on the default html.parser path fails the run; the other
+    combinations are reported so the fastest identical one can be adopted.
+    """
+    from extraction import PARSER_BACKENDS, parser_available
+    from steamrip_scraper import parse_game_html
+
+    pages = load_fixture_pages()
+    print(f"\nparse: parse_game_html over {len(pages)} fixture pages (median page)")
+    for parser in parsers or PARSER_BACKENDS:
+        if not parser_available(parser):
+            print(f"  {parser:<28} not installed, skipped")
+            continue
+        # selectolax always parses the scoped subtrees
+        for scoped in ([True] if parser == 'selectolax' else [False, True]):
+            mismatched = []
+            page_times = []
+            peak = 0
+            for filename, url, content, expected in pages:
+                with quiet():
+                    result = parse_game_html(content, url, parser=parser, scoped=scoped)
+                if result != expected:
+                    mismatched.append(filename)
+                seconds, page_peak = measure(lambda: parse_game_html(content, url, parser=parser, scoped=scoped), repeat)
+                page_times.append(seconds)
+                peak = max(peak, page_peak)
+            label = f"parse.{parser}{'.scoped' if scoped else ''}"
+            report.add(label, statistics.median(page_times), peak)
+            if mismatched:
+                message = f"{label} output differs from fixtures: {', '.join(mismatched)}"
+                if parser == 'html.parser' and not scoped:
+                    report.fail(message)
+                else:
+                    print(f"    {message}")
+
+
+def bench_list(report, repeat, parsers=None):
+    from extraction import PARSER_BACKENDS, parser_available
+    from steamrip_scraper import find_game_links
+
+    content, expected = load_list_fixture()
+    print(f"\nlist: find_game_links over the game list fixture ({len(expected)} games)")
+    for parser in parsers or PARSER_BACKENDS:
+        if not parser_available(parser):
+            continue
+        with quiet():
+            links = find_game_links(content, parser)
+        seconds, peak = measure(lambda: find_game_links(content, parser), repeat)
+        report.add(f"list.{parser}", seconds, peak)
+        if links != expected:
+            report.fail(f"list.{parser} found {len(links)} links, expected {len(expected)}")
+
+
+def bench_dates(report, count):
+    from steamrip_scraper import parse_date
+
+    date_strings = [DATE_STRINGS[i % len(DATE_STRINGS)] for i in range(count)]
+    print(f"\ndates: parse_date over {count} raw date strings")
+    seconds, peak = measure(lambda: [parse_date(date_str) for date_str in date_strings])
+    report.add('dates.parse_date', seconds, peak, per=count, unit='date')
+
+
+def bench_save(report, sizes):
+    from feeds import save_downloads
+
+    print("\nsave: save_downloads on synthetic catalogs")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            games = make_synthetic_games(size)
+            main_path = os.path.join(tmp_dir, f"main_{size}.json")
+            broad_path = os.path.join(tmp_dir, f"broad_{size}.json")
+            seconds, peak = measure(lambda: save_downloads(main_path, games, broad_path))
+            report.add(f"save.{size}", seconds, peak, per=size, unit='game')
+
+
+def bench_split(report, sizes):
+    import main as splitter
+
+    print("\nsplit: main.split_json_file on synthetic catalogs")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            input_path = os.path.join(tmp_dir, f"catalog_{size}.json")
+            with open(input_path, 'w', encoding='utf-8') as f:
+                json.dump({'name': 'HydraSteam Broad', 'downloads': make_synthetic_games(size)}, f, indent=2)
+            output_dir = os.path.join(tmp_dir, f"split_{size}")
+            seconds, peak = measure(lambda: splitter.split_json_file(input_path, output_dir, 200))
+            report.add(f"split.{size}", seconds, peak, per=size, unit='game')
+
+
+def imported_modules(argv):
+    """Top-level modules a fresh interpreter imports while running argv (from -X importtime)."""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + argv, capture_output=True, text=True)
+    return {line.rsplit('|', 1)[1].strip().split('.')[0] for line in result.stderr.splitlines()
+            if line.startswith('import time:') and line.count('|') == 2}
+
+
+def bench_startup(report, repeat):
+    print("\nstartup: hydrasteam.py subcommands in a fresh interpreter")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        games = make_synthetic_games(1000)
+        for file_name, name in (('hydrasteam.json', 'HydraSteam'), ('hydrasteam_broad.json', 'HydraSteam Broad')):
+            with open(os.path.join(tmp_dir, file_name), 'w', encoding='utf-8') as f:
+                json.dump({'name': name, 'downloads': games}, f, indent=2)
+        commands = [
+            ('python', ['-c', 'pass'], False),
+            ('help', [CLI, '--help'], True),
+            ('stats', [CLI, 'stats', '--output-dir', tmp_dir], True),
+            ('split', [CLI, 'split', '--output-dir', os.path.join(tmp_dir, 'split_files'),
+                       os.path.join(tmp_dir, 'hydrasteam.json')], True),
+            ('export', [CLI, 'export', '--output-dir', tmp_dir, '--no-deltas'], True),
+            ('publish', [CLI, 'publish', '--output-dir', tmp_dir, '--dry-run'], True),
+            ('serve', [CLI, 'serve', '--help'], True),
+            ('search', [CLI, 'search', '--output-dir', tmp_dir, 'synthetic game'], True),
+            ('scrape', [CLI, 'scrape', '--help'], False),
+        ]
+        for name, argv, light in commands:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                timings.append(time.perf_counter() - start)
+            report.add(f"startup.{name}", min(timings), 0)
+            heavy = HEAVY_MODULES & imported_modules(argv) if light else None
+            if heavy:
+                report.fail(f"hydrasteam.py {name} imports {', '.join(sorted(heavy))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for HydraSteam parsing and catalog stages.")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Synthetic catalog sizes.')
+    parser.add_argument('--batch-size', type=int, default=2000, help='Scraped games merged per refresh.')
+    parser.add_argument('--legacy', action='store_true', help='Also time the old linear title scan.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement (best run is kept).')
+    parser.add_argument('--parsers', nargs='+', help='Parser backends for the parse/list stages (default: all installed).')
+    parser.add_argument('--dates', type=int, default=10000, help='Date strings parsed in the dates stage.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline results to compare against.')
+    parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown/growth over the baseline (0.25 = 25%%).')
+    parser.add_argument('--min-seconds', type=float, default=0.002, help='Ignore time regressions smaller than this.')
+    parser.add_argument('--output', help='Write the results of this run as JSON.')
+    args = parser.parse_args()
+
+    report = Report()
+    if 'merge' in args.stages:
+        bench_merge(report, args.sizes, args.batch_size, legacy=args.legacy)
+    if 'memory' in args.stages:
+        bench_memory(report, args.sizes)
+    if 'search' in args.stages:
+        bench_search(report, args.sizes)
+    if 'parse' in args.stages:
+        bench_parse(report, args.repeat, args.parsers)
+    if 'list' in args.stages:
+        bench_list(report, args.repeat, args.parsers)
+    if 'dates' in args.stages:
+        bench_dates(report, args.dates)
+    if 'save' in args.stages:
+        bench_save(report, args.sizes)
+    if 'split' in args.stages:
+        bench_split(report, args.sizes)
+    if 'startup' in args.stages:
+        bench_startup(report, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report.results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report.results, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report.compare(json.load(f), args.threshold, args.min_seconds)
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+
+    sys.exit(1 if report.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
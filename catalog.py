@@ -0,0 +1,205 @@
+import re
+import sys
+
+# Matches a trailing version suffix such as "(v1.15)", "(Build 13623225)",
+# "(B14716072)", "(Update 7d)" or "(v1.0.62 + Co-op)".
+VERSION_SUFFIX_RE = re.compile(
+    r'\s*\(\s*((?:v|build|b[-_]?|update|dev build\s*v?)\s*\d[^()]*)\)\s*$',
+    re.IGNORECASE
+)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def split_title_version(title):
+    """Split a game title into its base title and version suffix (or None)."""
+    title = (title or '').strip()
+    match = VERSION_SUFFIX_RE.search(title)
+    if not match:
+        return title, None
+    return title[:match.start()].strip(), match.group(1).strip()
+
+
+def game_key(title):
+    """Return the normalized identity of a game: its lowercased base title."""
+    base_title, _ = split_title_version(title)
+    return WHITESPACE_RE.sub(' ', base_title).lower()
+
+
+def intern_value(value):
+    """Share one copy of a repeated string ("Unknown", "2.5 GB", dates) across all records."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class GameRecord:
+    """
+    A game in the catalog, stored compactly: no per-instance dict, its URIs in a
+    tuple, and the file size and upload date (a few thousand distinct values over
+    the whole catalog) interned. Games only become dicts at the edges: when read
+    from or written to JSON (see from_dict / to_dict).
+    """
+
+    __slots__ = ('title', 'file_size', 'upload_date', 'uris')
+
+    def __init__(self, title='', file_size='', upload_date='', uris=()):
+        self.title = title
+        self.file_size = intern_value(file_size)
+        self.upload_date = intern_value(upload_date)
+        self.uris = tuple(uris)
+
+    @classmethod
+    def from_dict(cls, game):
+        return cls(game.get('title', ''), game.get('fileSize', ''), game.get('uploadDate', ''), game.get('uris') or ())
+
+    def to_dict(self):
+        """The game in the published JSON schema (and key order)."""
+        return {'title': self.title, 'fileSize': self.file_size, 'uploadDate': self.upload_date, 'uris': list(self.uris)}
+
+    def __eq__(self, other):
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return (self.title == other.title and self.file_size == other.file_size
+                and self.upload_date == other.upload_date and self.uris == other.uris)
+
+    __hash__ = None # Mutable, like the dicts it replaces
+
+    def __repr__(self):
+        return f"GameRecord({self.title!r}, {self.file_size!r}, {self.upload_date!r}, {len(self.uris)} uris)"
+
+
+def as_record(game):
+    """A GameRecord for a game given as a record or as a dict in the JSON schema."""
+    return game if isinstance(game, GameRecord) else GameRecord.from_dict(game)
+
+
+class CatalogIndex:
+    """
+    In-memory game catalog with O(1) lookup, insert and in-place update.
+
+    Games are kept as GameRecords (dicts passed in are converted), in insertion
+    order (so saved files stay stable), and are indexed twice:
+    - by exact lowercased title, which is how the scraper always matched games
+    - by identity key (base title without the version suffix), so a page whose
+      title moved from "(v1.1)" to "(v1.2)" updates its entry instead of
+      adding a duplicate
+    """
+
+    def __init__(self, games=()):
+        self._games = []
+        self._by_title = {}
+        self._by_key = {}
+        for game in games:
+            self._append(as_record(game))
+
+    def __len__(self):
+        return len(self._games)
+
+    def __iter__(self):
+        return iter(self._games)
+
+    def __contains__(self, title):
+        return self.find(title) is not None
+
+    @property
+    def games(self):
+        return self._games
+
+    def find(self, title):
+        """Return the position of the entry matching a title, or None."""
+        title_lower = (title or '').strip().lower()
+        position = self._by_title.get(title_lower)
+        if position is not None:
+            return position
+        # No exact match: fall back to the identity key, but only when it is
+        # unambiguous (some base titles exist in several editions)
+        positions = self._by_key.get(game_key(title))
+        return positions if type(positions) is int else None
+
+    def get(self, title):
+        position = self.find(title)
+        return self._games[position] if position is not None else None
+
+    def _append(self, game):
+        # Existing entries are loaded as-is: earlier duplicates keep the title
+        # slot, and identity keys never merge entries that are already stored
+        # (a key held by one game maps to its position, a shared one to a list of them)
+        title = game.title.strip()
+        position = len(self._games)
+        self._games.append(game)
+        title_lower = title.lower()
+        self._by_title.setdefault(title_lower, position)
+        key = game_key(title)
+        if key == title_lower:
+            key = title_lower # Most titles have no version suffix: keep one string for both indexes
+        positions = self._by_key.get(key)
+        if positions is None:
+            self._by_key[key] = position
+        elif type(positions) is int:
+            self._by_key[key] = [positions, position]
+        else:
+            positions.append(position)
+
+    def upsert(self, game):
+        """
+        Insert a game or update the matching entry in place.
+        Returns 'added', 'updated' or 'unchanged'.
+        """
+        game = as_record(game)
+        title = game.title.strip()
+        position = self.find(title)
+
+        if position is None:
+            self._append(game)
+            return 'added'
+
+        existing_game = self._games[position]
+        if existing_game == game:
+            return 'unchanged'
+
+        old_title = existing_game.title.strip()
+        if old_title.lower() != title.lower():
+            # Version bump: re-point the exact-title entry at the same slot
+            if self._by_title.get(old_title.lower()) == position:
+                del self._by_title[old_title.lower()]
+            self._by_title[title.lower()] = position
+        self._games[position] = game
+        return 'updated'
+
+
+def join_published_downloads(main_downloads, broad_downloads):
+    """
+    Rebuild the full catalog from the two published feeds, which split each
+    game's URIs between them (gofile.io links in the main feed, all others in
+    the broad feed). Games are joined on their exact lowercased title and their
+    URIs re-merged in sorted order, the order extract_game_details produces.
+    Both feeds keep their order: games listed in both are the points where the
+    two lists are interleaved, so saving the result lists the games as before.
+    A game has one size and date: where the feeds disagree the main feed's values
+    win, so saving rewrites those entries of the broad feed. Returns GameRecords.
+    """
+    games = {}
+
+    def add(game):
+        title_lower = game.get('title', '').strip().lower()
+        existing = games.get(title_lower)
+        if existing is None:
+            games[title_lower] = GameRecord.from_dict(game)
+        else:
+            existing.uris = tuple(sorted(set(existing.uris) | set(game.get('uris') or ())))
+
+    main_downloads = list(main_downloads)
+    main_titles = {game.get('title', '').strip().lower() for game in main_downloads}
+    next_main = 0
+    for game in broad_downloads:
+        title_lower = game.get('title', '').strip().lower()
+        if title_lower in main_titles:
+            # Catch the main feed up to this game first
+            while next_main < len(main_downloads):
+                main_game = main_downloads[next_main]
+                next_main += 1
+                add(main_game)
+                if main_game.get('title', '').strip().lower() == title_lower:
+                    break
+        add(game)
+    for game in main_downloads[next_main:]:
+        add(game)
+    return list(games.values())
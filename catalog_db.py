@@ -0,0 +1,209 @@
+import json
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+from catalog import GameRecord, as_record, game_key, split_title_version
+from scrape_state import content_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    title_lower TEXT NOT NULL,
+    identity_key TEXT NOT NULL,
+    version TEXT,
+    file_size TEXT,
+    upload_date TEXT
+);
+CREATE INDEX IF NOT EXISTS games_title_lower ON games (title_lower);
+CREATE INDEX IF NOT EXISTS games_identity_key ON games (identity_key);
+CREATE INDEX IF NOT EXISTS games_position ON games (position);
+
+CREATE TABLE IF NOT EXISTS hosts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS uris (
+    game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    uri TEXT NOT NULL,
+    host_id INTEGER NOT NULL REFERENCES hosts (id),
+    PRIMARY KEY (game_id, position)
+);
+CREATE INDEX IF NOT EXISTS uris_host ON uris (host_id);
+
+CREATE TABLE IF NOT EXISTS scrape_state (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT,
+    last_modified TEXT,
+    last_seen TEXT,
+    missing_since TEXT,
+    record TEXT
+);
+"""
+
+
+class CatalogStore:
+    """
+    SQLite-backed game catalog, usable wherever a CatalogIndex is: it matches
+    games the same way (exact lowercased title, then an unambiguous identity
+    key) and iterates games in insertion order as GameRecords.
+
+    Every upsert is its own transaction, so the store is always consistent on
+    disk and the published JSON files are just exports of it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(SCHEMA)
+        self._host_ids = dict((name, host_id) for host_id, name in self.conn.execute('SELECT id, name FROM hosts'))
+        self._next_position = self.conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM games').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM games LIMIT 1').fetchone() is None
+
+    def __iter__(self):
+        uris = {}
+        for game_id, uri in self.conn.execute('SELECT game_id, uri FROM uris ORDER BY game_id, position'):
+            uris.setdefault(game_id, []).append(uri)
+        rows = self.conn.execute('SELECT id, title, file_size, upload_date FROM games ORDER BY position')
+        for game_id, title, file_size, upload_date in rows:
+            yield GameRecord(title, file_size, upload_date, uris.get(game_id, ()))
+
+    def _host_id(self, uri):
+        host = urlparse(uri).netloc.lower()
+        host_id = self._host_ids.get(host)
+        if host_id is None:
+            host_id = self.conn.execute('INSERT INTO hosts (name) VALUES (?)', (host,)).lastrowid
+            self._host_ids[host] = host_id
+        return host_id
+
+    def _load_game(self, game_id):
+        title, file_size, upload_date = self.conn.execute(
+            'SELECT title, file_size, upload_date FROM games WHERE id = ?', (game_id,)).fetchone()
+        uris = [uri for uri, in self.conn.execute('SELECT uri FROM uris WHERE game_id = ? ORDER BY position', (game_id,))]
+        return GameRecord(title, file_size, upload_date, uris)
+
+    def find(self, title):
+        """Return the id of the game matching a title, or None."""
+        title = (title or '').strip()
+        row = self.conn.execute('SELECT id FROM games WHERE title_lower = ? ORDER BY position LIMIT 1',
+                                (title.lower(),)).fetchone()
+        if row:
+            return row[0]
+        rows = self.conn.execute('SELECT id FROM games WHERE identity_key = ? LIMIT 2', (game_key(title),)).fetchall()
+        return rows[0][0] if len(rows) == 1 else None
+
+    def get(self, title):
+        game_id = self.find(title)
+        return self._load_game(game_id) if game_id is not None else None
+
+    def _write_game(self, game_id, game):
+        title = game.title.strip()
+        _, version = split_title_version(title)
+        values = (title, title.lower(), game_key(title), version, game.file_size, game.upload_date)
+        if game_id is None:
+            game_id = self.conn.execute(
+                'INSERT INTO games (position, title, title_lower, identity_key, version, file_size, upload_date) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (self._next_position,) + values).lastrowid
+            self._next_position += 1
+        else:
+            self.conn.execute(
+                'UPDATE games SET title = ?, title_lower = ?, identity_key = ?, version = ?, file_size = ?, upload_date = ? '
+                'WHERE id = ?', values + (game_id,))
+            self.conn.execute('DELETE FROM uris WHERE game_id = ?', (game_id,))
+        self.conn.executemany(
+            'INSERT INTO uris (game_id, position, uri, host_id) VALUES (?, ?, ?, ?)',
+            [(game_id, i, uri, self._host_id(uri)) for i, uri in enumerate(game.uris)])
+        return game_id
+
+    def upsert(self, game):
+        """
+        Insert a game or update the matching entry, in one transaction.
+        Returns 'added', 'updated' or 'unchanged'.
+        """
+        game = as_record(game)
+        game_id = self.find(game.title)
+        if game_id is not None and self._load_game(game_id) == game:
+            return 'unchanged'
+        with self.conn:
+            self._write_game(game_id, game)
+        return 'added' if game_id is None else 'updated'
+
+    def import_games(self, games):
+        """Bulk-load games as-is (no merging), in one transaction."""
+        with self.conn:
+            for game in games:
+                self._write_game(None, as_record(game))
+
+    def games_for_host(self, host):
+        """Titles of the games with at least one URI on the given host."""
+        rows = self.conn.execute(
+            'SELECT DISTINCT g.title, g.position FROM games g JOIN uris u ON u.game_id = g.id '
+            'JOIN hosts h ON h.id = u.host_id WHERE h.name = ? ORDER BY g.position', (host.lower(),))
+        return [title for title, _ in rows]
+
+    def host_counts(self):
+        """Number of URIs per host, largest first."""
+        return self.conn.execute(
+            'SELECT h.name, COUNT(*) FROM uris u JOIN hosts h ON h.id = u.host_id '
+            'GROUP BY h.name ORDER BY COUNT(*) DESC').fetchall()
+
+    def scrape_state(self):
+        return DbScrapeState(self.conn)
+
+
+class DbScrapeState:
+    """ScrapeState kept in the catalog database's scrape_state table."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def unchanged_record(self, url, content):
+        row = self.conn.execute('SELECT content_hash, record FROM scrape_state WHERE url = ?', (url,)).fetchone()
+        if row and row[1] and row[0] == content_hash(content):
+            return json.loads(row[1])
+        return None
+
+    def update(self, url, content, record, last_modified=None):
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO scrape_state (url, content_hash, last_modified, record) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (url) DO UPDATE SET content_hash = excluded.content_hash, '
+                'last_modified = excluded.last_modified, record = excluded.record',
+                (url, content_hash(content), last_modified, json.dumps(record, ensure_ascii=False)))
+
+    def mark_listed(self, game_links):
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO scrape_state (url, last_seen) VALUES (?, ?) '
+                'ON CONFLICT (url) DO UPDATE SET last_seen = excluded.last_seen, missing_since = NULL',
+                [(url, now) for url in game_links])
+            newly_missing = [url for url, in self.conn.execute(
+                'SELECT url FROM scrape_state WHERE last_seen IS NOT ? AND missing_since IS NULL', (now,))]
+            self.conn.execute(
+                'UPDATE scrape_state SET missing_since = ? WHERE last_seen IS NOT ? AND missing_since IS NULL', (now, now))
+        return newly_missing
+
+    def missing(self):
+        return [url for url, in self.conn.execute('SELECT url FROM scrape_state WHERE missing_since IS NOT NULL')]
+
+    def known_urls(self):
+        return {url for url, in self.conn.execute('SELECT url FROM scrape_state WHERE record IS NOT NULL')}
+
+    def save(self):
+        pass # Every update is already committed
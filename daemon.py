@@ -0,0 +1,416 @@
+import argparse
+import heapq
+import json
+import os
+import signal
+import threading
+import time
+from functools import partial
+
+import steamrip_scraper as scraper
+from catalog import CatalogIndex
+from feeds import build_feeds, feed_paths, load_published_catalog, save_downloads
+from journal import CheckpointJournal
+from metrics import LOG_FORMATS, METRICS, configure_logging, fields, log, write_run_report
+from pacing import PacingController
+from pipeline import PagePipeline
+from publish import git_commit_and_push, published_paths
+from scrape_state import ScrapeState
+
+LIST_INTERVAL = 600 # Seconds between game list fetches
+PAGES_PER_CYCLE = 50 # Most game pages fetched per refresh cycle
+RECENT_INTERVAL = 3600 # Seconds before a page whose game just changed is checked again
+MAX_INTERVAL = 7 * 86400 # Longest gap between checks of a page that never changes
+STABLE_AFTER = 3 # Unchanged checks in a row before a page counts as stable
+PUBLISH_THRESHOLD = 10 # Changed games that trigger a publish
+PUBLISH_MAX_DELAY = 3600 # Seconds after which fewer changes are published anyway
+MAX_IDLE_SLEEP = 60 # Longest sleep between cycles (so a stop request is never waited on for long)
+
+# Scheduling tiers, most urgent first
+NEW, RECENT, STABLE = 0, 1, 2
+TIER_NAMES = ('new', 'recent', 'stable')
+
+
+class RefreshScheduler:
+    """
+    Priority schedule of game page refreshes:
+    - a newly listed page is due at once (tier 'new')
+    - a page whose game just changed is checked again after recent_interval (tier 'recent')
+    - every check that finds no change doubles the page's interval, up to max_interval;
+      after stable_after such checks in a row the page is 'stable'
+    pop_due() hands out due pages tier by tier, most overdue first within a tier,
+    so new games are never stuck behind a backlog of stable pages.
+    The schedule is kept in memory and saved to path so a restart picks it up.
+    """
+
+    def __init__(self, path=None, recent_interval=RECENT_INTERVAL, max_interval=MAX_INTERVAL,
+                 stable_after=STABLE_AFTER):
+        self.path = path
+        self.recent_interval = recent_interval
+        self.max_interval = max_interval
+        self.stable_after = stable_after
+        self.pages = {} # url -> {'tier', 'due', 'interval', 'unchanged', 'last_checked', 'last_changed'}
+        self.heaps = [[], [], []] # (due, url) per tier; entries no longer matching self.pages are skipped
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.pages = json.load(f).get('pages', {})
+                log.info(f"Loaded refresh schedule for {len(self.pages)} pages from {path}",
+                         extra=fields(event='schedule_loaded', path=path, pages=len(self.pages)))
+            except (json.JSONDecodeError, AttributeError) as e:
+                log.warning(f"Warning: Could not read refresh schedule from {path}: {e}. Starting fresh.",
+                            extra=fields(event='schedule_error', path=path, error=str(e)))
+            for url, page in self.pages.items():
+                if page['due'] is None: # Handed out but never checked
+                    page['due'] = 0.0
+                heapq.heappush(self.heaps[page['tier']], (page['due'], url))
+
+    def _schedule(self, url, tier, due, interval, unchanged=0, **extra):
+        page = self.pages.get(url) or {'last_checked': None, 'last_changed': None}
+        page.update(tier=tier, due=due, interval=interval, unchanged=unchanged, **extra)
+        self.pages[url] = page
+        heapq.heappush(self.heaps[tier], (due, url))
+
+    def sync(self, urls, now, known_urls=()):
+        """
+        Match the schedule to the game list. Returns (added, removed) URLs.
+        Pages first seen with an empty schedule that were already scraped (known_urls)
+        are spread over the next recent_interval instead of all being due at once.
+        """
+        bootstrap = not self.pages
+        listed = list(dict.fromkeys(urls))
+        added = [url for url in listed if url not in self.pages]
+        known = [url for url in added if url in known_urls] if bootstrap else []
+        known_set = set(known)
+        for url in added:
+            if url not in known_set:
+                self._schedule(url, NEW, now, self.recent_interval)
+        for i, url in enumerate(known):
+            self._schedule(url, STABLE, now + self.recent_interval * i / len(known), self.recent_interval)
+        listed_set = set(listed)
+        removed = [url for url in self.pages if url not in listed_set]
+        for url in removed:
+            del self.pages[url]
+        return added, removed
+
+    def pop_due(self, now, limit):
+        """Up to limit due URLs, by tier and then by due time."""
+        due = []
+        for tier, heap in enumerate(self.heaps):
+            while heap and len(due) < limit and heap[0][0] <= now:
+                due_time, url = heapq.heappop(heap)
+                page = self.pages.get(url)
+                if page is not None and page['tier'] == tier and page['due'] == due_time:
+                    due.append(url)
+                    page['due'] = None # Handed out; record() schedules it again
+        return due
+
+    def record(self, url, changed, now):
+        """Reschedule a checked page; changed says whether its game was added or updated."""
+        page = self.pages.get(url)
+        if page is None:
+            return
+        if changed:
+            self._schedule(url, RECENT, now + self.recent_interval, self.recent_interval,
+                           last_checked=now, last_changed=now)
+            return
+        unchanged = page['unchanged'] + 1
+        interval = page['interval'] if page['tier'] == NEW else min(self.max_interval, page['interval'] * 2)
+        tier = STABLE if unchanged >= self.stable_after or page['tier'] == STABLE else RECENT
+        self._schedule(url, tier, now + interval, interval, unchanged, last_checked=now)
+
+    def record_failure(self, url, now):
+        """Back off a page that could not be fetched or parsed: its interval doubles, its tier stays."""
+        page = self.pages.get(url)
+        if page is not None:
+            interval = min(self.max_interval, page['interval'] * 2)
+            self._schedule(url, page['tier'], now + interval, interval, page['unchanged'], last_checked=now)
+
+    def retry(self, url, due):
+        """Put a page that was handed out but not checked back in its tier, due again at due."""
+        page = self.pages.get(url)
+        if page is not None and page['due'] is None:
+            self._schedule(url, page['tier'], due, page['interval'], page['unchanged'])
+
+    def next_due(self):
+        """Earliest due time of any scheduled page, or None."""
+        times = [heap[0][0] for heap in self.heaps if heap]
+        return min(times) if times else None
+
+    def counts(self):
+        counts = dict.fromkeys(TIER_NAMES, 0)
+        for page in self.pages.values():
+            counts[TIER_NAMES[page['tier']]] += 1
+        return counts
+
+    def save(self):
+        if not self.path:
+            return
+        for tier, heap in enumerate(self.heaps):
+            # Drop stale heap entries now and then so the heaps do not grow without bound
+            if len(heap) > 2 * len(self.pages) + 1024:
+                self.heaps[tier] = [(page['due'], url) for url, page in self.pages.items()
+                                    if page['tier'] == tier and page['due'] is not None]
+                heapq.heapify(self.heaps[tier])
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': self.pages}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class RefreshDaemon:
+    """
+    Keeps the catalog in memory and refreshes it in cycles:
+    1. every list_interval seconds the game list is fetched and the schedule synced with it
+    2. the pages the scheduler says are due (at most pages_per_cycle) go through the
+       fetch/parse pipeline, which stays up between cycles, and are merged into the catalog
+    3. once publish_threshold games have changed, or publish_max_delay seconds have
+       passed since the first unpublished change, the feeds are saved (and split/pushed)
+    Changes are journaled as they are merged, so a crash between publishes loses nothing.
+    """
+
+    def __init__(self, output_dir, db_path=None, replay_path=None, record_dir=None, split=False, push=False,
+                 pages_per_cycle=PAGES_PER_CYCLE, list_interval=LIST_INTERVAL, publish_threshold=PUBLISH_THRESHOLD,
+                 publish_max_delay=PUBLISH_MAX_DELAY, recent_interval=RECENT_INTERVAL, max_interval=MAX_INTERVAL,
+                 fetch_workers=None, parse_workers=None):
+        self.output_dir = output_dir
+        self.main_path, self.broad_path = feed_paths(output_dir)
+        scraper.JSON_FILE_PATH = self.main_path
+        self.split = split
+        self.push = push and replay_path is None
+        self.pages_per_cycle = pages_per_cycle
+        self.list_interval = list_interval
+        self.publish_threshold = publish_threshold
+        self.publish_max_delay = publish_max_delay
+        self.stop_event = threading.Event()
+
+        self.catalog_store = None
+        self.journal = None
+        if db_path:
+            self.catalog_store = scraper.open_catalog_store(db_path, self.main_path, self.broad_path)
+            self.catalog = self.catalog_store
+            self.scrape_state = self.catalog_store.scrape_state()
+        else:
+            self.catalog = CatalogIndex(load_published_catalog(self.main_path, self.broad_path))
+            self.journal = CheckpointJournal(os.path.join(output_dir, 'hydrasteam.journal.jsonl'))
+            self.scrape_state = ScrapeState(os.path.join(output_dir, 'scrape_state.json'))
+        self.scheduler = RefreshScheduler(os.path.join(output_dir, 'refresh_schedule.json'),
+                                          recent_interval, max_interval)
+
+        # Changes merged but not yet published; a journal left by an unfinished run counts too
+        self.pending = {'added': 0, 'updated': 0}
+        self.first_pending = None
+        if self.journal is not None:
+            recovered = sum(1 for game in self.journal.replay() if self.catalog.upsert(game) != 'unchanged')
+            if recovered:
+                log.info(f"♻️ Recovered {recovered} games from the journal of an unfinished run",
+                         extra=fields(event='journal_recovered', games=recovered))
+                self._note_changes('updated', recovered, time.time())
+
+        self.session = scraper.make_session(replay_path, record_dir)
+        self.session.headers.update(scraper.HEADERS)
+        self.pacer = PacingController(base_interval=0 if replay_path else scraper.REQUEST_INTERVAL)
+        self.pipeline = PagePipeline(
+            self.session, partial(scraper.fetch_game_page, pacer=self.pacer),
+            partial(scraper.parse_game_html, parser=scraper.HTML_PARSER,
+                    scoped=scraper.SCOPED_PARSING or scraper.HTML_PARSER == 'selectolax'),
+            fetch_workers=fetch_workers or scraper.FETCH_WORKERS,
+            parse_workers=scraper.PARSE_WORKERS if parse_workers is None else parse_workers,
+            scrape_state=self.scrape_state)
+        self.next_list_fetch = 0.0
+        self.cycles = 0
+
+    def _note_changes(self, status, count, now):
+        self.pending[status] += count
+        if self.first_pending is None:
+            self.first_pending = now
+
+    def refresh_list(self, now):
+        """Fetch the game list and sync the schedule with it; False if the list could not be fetched."""
+        self.next_list_fetch = now + self.list_interval
+        try:
+            response = self.session.get(scraper.GAME_LIST_URL, headers=scraper.HEADERS, timeout=30)
+            response.raise_for_status()
+        except Exception as e:
+            METRICS.incr('daemon.list_errors')
+            log.error(f"Error fetching game list page: {e}", extra=fields(event='list_error', error=str(e)))
+            return False
+        links = scraper.find_game_links(response.content)
+        self.scrape_state.mark_listed(links)
+        added, removed = self.scheduler.sync(links, now, self.scrape_state.known_urls())
+        if added or removed:
+            log.info(f"📋 Game list: {len(links)} pages, {len(added)} newly listed, {len(removed)} gone",
+                     extra=fields(event='list', pages=len(links), added=len(added), removed=len(removed)))
+        return True
+
+    def run_cycle(self, now):
+        """Refresh the due pages; returns how many were checked."""
+        urls = self.scheduler.pop_due(now, self.pages_per_cycle)
+        if not urls:
+            return 0
+        tiers = [TIER_NAMES[self.scheduler.pages[url]['tier']] for url in urls]
+        for tier in tiers:
+            METRICS.incr(f"daemon.pages.{tier}")
+        checked = 0
+        for url, game_data, page_unchanged, error in self.pipeline.run(urls):
+            if error is not None or not game_data or not game_data.get('title', '').strip():
+                # Fetch or parse failures are retried later, not counted as "unchanged"
+                self.scheduler.record_failure(url, time.time())
+                continue
+            checked += 1
+            status = self.catalog.upsert(game_data)
+            METRICS.incr(f"merge.{status}")
+            if status != 'unchanged':
+                if self.journal is not None:
+                    self.journal.append(game_data)
+                self._note_changes(status, 1, time.time())
+                label = "✅ Added" if status == 'added' else "🔄 Updated"
+                log.info(f"{label}: {game_data['title']}", extra=fields(event=status, url=url, title=game_data['title']))
+            self.scheduler.record(url, status != 'unchanged', time.time())
+            if self.stop_event.is_set():
+                break
+        for url in urls:
+            self.scheduler.retry(url, now) # Left over by a stop: due again right away
+        METRICS.incr('daemon.cycles')
+        self.cycles += 1
+        return checked
+
+    def should_publish(self, now):
+        changes = sum(self.pending.values())
+        if not changes:
+            return False
+        return changes >= self.publish_threshold or now - self.first_pending >= self.publish_max_delay
+
+    def publish(self):
+        """Save the feeds (split and push them if enabled) with the changes merged so far."""
+        added, updated = self.pending['added'], self.pending['updated']
+        log.info(f"💾 Publishing {added} added and {updated} updated games ({len(self.catalog)} in the catalog)...",
+                 extra=fields(event='publish', added=added, updated=updated, games=len(self.catalog)))
+        with METRICS.timer('save'):
+            saved = save_downloads(self.main_path, self.catalog, self.broad_path, os.path.join(self.output_dir, 'deltas'))
+        if not saved:
+            return False
+        if self.journal is not None:
+            self.journal.compact()
+        self.scrape_state.save()
+        self.scheduler.save()
+        self.pending = {'added': 0, 'updated': 0}
+        self.first_pending = None
+        feeds = build_feeds(self.main_path, self.broad_path)
+        if self.split:
+            with METRICS.timer('split'):
+                scraper.split_outputs([feed.path for feed in feeds])
+        if self.push:
+            with METRICS.timer('git'):
+                git_commit_and_push(published_paths(feeds, self.output_dir),
+                                    f"Update game list: {added} new, {updated} updated games.")
+        METRICS.incr('daemon.publishes')
+        self.write_report()
+        return True
+
+    def write_report(self):
+        write_run_report(os.path.join(self.output_dir, 'run_report.json'),
+                         run={'mode': 'daemon', 'cycles': self.cycles, 'catalog': len(self.catalog)},
+                         schedule=self.scheduler.counts(),
+                         pacing={host: {'level': pace.level, 'throttled': pace.throttled, 'errors': pace.errors}
+                                 for host, pace in sorted(self.pacer.hosts.items())})
+
+    def sleep_seconds(self, now):
+        wake = self.next_list_fetch
+        next_due = self.scheduler.next_due()
+        if next_due is not None:
+            wake = min(wake, next_due)
+        return max(0.0, min(wake - now, MAX_IDLE_SLEEP))
+
+    def run(self, max_cycles=None):
+        """
+        Refresh until stop() (SIGINT/SIGTERM) or, with max_cycles, until that many passes have
+        run; idle passes count, and a bounded run ends at the first one rather than sleep.
+        """
+        log.info(f"🛰️ Refresh daemon started: {len(self.catalog)} games in the catalog, "
+                 f"up to {self.pages_per_cycle} pages per cycle, publishing after {self.publish_threshold} changes",
+                 extra=fields(event='daemon_started', games=len(self.catalog), pages_per_cycle=self.pages_per_cycle,
+                              publish_threshold=self.publish_threshold))
+        passes = 0
+        try:
+            while not self.stop_event.is_set():
+                passes += 1
+                now = time.time()
+                if now >= self.next_list_fetch:
+                    self.refresh_list(now)
+                with METRICS.timer('daemon.cycle'):
+                    checked = self.run_cycle(now)
+                if checked:
+                    counts = self.scheduler.counts()
+                    log.info(f"🔁 Cycle {self.cycles}: {checked} pages checked, {sum(self.pending.values())} changes "
+                             f"unpublished | schedule: {counts['new']} new, {counts['recent']} recent, "
+                             f"{counts['stable']} stable",
+                             extra=fields(event='cycle', cycle=self.cycles, checked=checked,
+                                          unpublished=sum(self.pending.values()), schedule=counts))
+                if self.should_publish(time.time()):
+                    self.publish()
+                # Nothing due means everything is scheduled into the future: waiting for it
+                # could take hours, so a bounded run stops here instead of sleeping
+                if max_cycles is not None and (passes >= max_cycles or not checked):
+                    break
+                if not checked:
+                    self.stop_event.wait(self.sleep_seconds(time.time()))
+        finally:
+            # Publish what has been merged so far before leaving
+            if sum(self.pending.values()):
+                self.publish()
+            self.scrape_state.save()
+            self.scheduler.save()
+            self.pipeline.close()
+            if self.journal is not None:
+                self.journal.close()
+            if self.catalog_store is not None:
+                self.catalog_store.close()
+            self.write_report()
+            log.info("👋 Refresh daemon stopped.", extra=fields(event='daemon_stopped', cycles=self.cycles))
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            log.info("⏸️ Stopping after the current page...", extra=fields(event='stopping'))
+        self.stop_event.set()
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Keep the feeds fresh with a long-running refresh loop.")
+    parser.add_argument('--output-dir', default='.', help='Directory holding the feeds.')
+    parser.add_argument('--db', help='SQLite catalog database to use as the source of truth.')
+    parser.add_argument('--split', action='store_true', help='Regenerate split_files/ on every publish.')
+    parser.add_argument('--push', action='store_true', help='Commit and push on every publish.')
+    parser.add_argument('--pages-per-cycle', type=int, default=PAGES_PER_CYCLE, help='Most game pages fetched per cycle.')
+    parser.add_argument('--list-interval', type=float, default=LIST_INTERVAL, help='Seconds between game list fetches.')
+    parser.add_argument('--publish-threshold', type=int, default=PUBLISH_THRESHOLD, help='Changed games that trigger a publish.')
+    parser.add_argument('--publish-max-delay', type=float, default=PUBLISH_MAX_DELAY,
+                        help='Seconds after which fewer changes are published anyway.')
+    parser.add_argument('--recent-interval', type=float, default=RECENT_INTERVAL,
+                        help='Seconds before a page whose game changed is checked again (doubles while it stays unchanged).')
+    parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL, help='Longest gap between checks of a page.')
+    parser.add_argument('--cycles', type=int, help='Stop after this many cycles or once nothing is due (default: run until stopped).')
+    parser.add_argument('--replay', help='Serve the list page and every game page from an archive (for testing).')
+    parser.add_argument('--record', help='Save every fetched page into this directory archive.')
+    parser.add_argument('--fetch-workers', type=int, help='Concurrent game page fetches.')
+    parser.add_argument('--parse-workers', type=int, help='Parser processes (0 parses in the main process).')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO', help='Log messages at or above this level are shown.')
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='text', help='Log messages as plain text or as JSON lines.')
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level, args.log_format)
+    os.makedirs(args.output_dir, exist_ok=True)
+    daemon = RefreshDaemon(args.output_dir, db_path=args.db, replay_path=args.replay, record_dir=args.record,
+                           split=args.split, push=args.push, pages_per_cycle=args.pages_per_cycle,
+                           list_interval=args.list_interval, publish_threshold=args.publish_threshold,
+                           publish_max_delay=args.publish_max_delay, recent_interval=args.recent_interval,
+                           max_interval=args.max_interval, fetch_workers=args.fetch_workers,
+                           parse_workers=args.parse_workers)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run(args.cycles)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
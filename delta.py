@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import time
+
+from catalog import game_key
+
+# Deltas kept per feed; older ones are pruned (clients that far behind refetch the snapshot)
+DELTA_HISTORY = 30
+
+
+def feed_version(downloads):
+    """Version id of a feed: a hash of its games in published order."""
+    data = json.dumps(downloads, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+def keyed_games(downloads):
+    """Games by identity key (game_key); repeated keys get an occurrence suffix so none are lost."""
+    games = {}
+    for game in downloads:
+        base = game_key(game.get('title', ''))
+        key = base
+        occurrence = 1
+        while key in games:
+            occurrence += 1
+            key = f"{base}#{occurrence}"
+        games[key] = game
+    return games
+
+
+def compute_delta(old_downloads, new_downloads):
+    """
+    What changed between two versions of a feed, matching games by key (the lowercased
+    title without its version, so a version bump is an update rather than a remove + add):
+    - added: the new games, in full
+    - updated: {"key": ..., "title": ..., "changes": {field: new value}} with only the
+      changed fields, "title" included when the version in it changed
+    - removed: keys of the games that are gone
+    """
+    old_games = keyed_games(old_downloads)
+    new_games = keyed_games(new_downloads)
+    added = []
+    updated = []
+    for key, game in new_games.items():
+        old = old_games.get(key)
+        if old is None:
+            added.append(game)
+            continue
+        changes = {field: game.get(field) for field in set(old) | set(game) if old.get(field) != game.get(field)}
+        if changes:
+            updated.append({'key': key, 'title': game.get('title', ''), 'changes': dict(sorted(changes.items()))})
+    removed = [key for key in old_games if key not in new_games]
+    return {'added': added, 'updated': updated, 'removed': removed}
+
+
+class DeltaFeed:
+    """
+    Deltas between published versions of one feed, kept in <delta_dir>/<feed>/:
+    - <from>_<to>.json: the changes taking version <from> to version <to>
+    - index.json: the current version and the chain of deltas, oldest first
+    A client at version X applies the deltas from the entry whose "from" is X onwards;
+    if X is no longer in the chain it downloads the full snapshot again.
+    """
+
+    def __init__(self, delta_dir, feed_name, history=DELTA_HISTORY):
+        self.path = os.path.join(delta_dir, feed_name)
+        self.feed_name = feed_name
+        self.history = history
+        self.index_path = os.path.join(self.path, 'index.json')
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'feed': self.feed_name, 'version': None, 'deltas': []}
+
+    def publish(self, old_downloads, new_downloads):
+        """Record the delta from the previously published games to new_downloads. Returns the delta entry or None."""
+        index = self.load_index()
+        old_version = feed_version(old_downloads) if old_downloads else index.get('version')
+        new_version = feed_version(new_downloads)
+        if old_version == new_version:
+            return None
+
+        os.makedirs(self.path, exist_ok=True)
+        entry = None
+        if old_downloads:
+            delta = compute_delta(old_downloads, new_downloads)
+            created = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            file_name = f"{old_version}_{new_version}.json"
+            data = json.dumps(dict({'feed': self.feed_name, 'from': old_version, 'to': new_version,
+                                    'created': created}, **delta), ensure_ascii=False, separators=(',', ':'))
+            write_atomic(os.path.join(self.path, file_name), data)
+            entry = {'from': old_version, 'to': new_version, 'file': file_name, 'created': created,
+                     'bytes': len(data.encode('utf-8')), 'added': len(delta['added']),
+                     'updated': len(delta['updated']), 'removed': len(delta['removed'])}
+            index['deltas'].append(entry)
+
+        deltas = index['deltas']
+        # Keep the unbroken chain ending at the new version; a snapshot edited by hand breaks it
+        start = len(deltas)
+        if entry:
+            start -= 1
+            while start > 0 and deltas[start - 1]['to'] == deltas[start]['from']:
+                start -= 1
+        start = max(start, len(deltas) - self.history)
+        for stale in deltas[:start]:
+            try:
+                os.remove(os.path.join(self.path, stale['file']))
+            except FileNotFoundError:
+                pass
+        index['deltas'] = deltas[start:]
+        index['version'] = new_version
+        write_atomic(self.index_path, json.dumps(index, ensure_ascii=False, indent=2))
+        return entry
+
+
+def write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
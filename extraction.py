@@ -0,0 +1,412 @@
+import importlib.util
+import json
+import re
+
+from bs4 import BeautifulSoup, NavigableString
+
+from metrics import fields, log
+
+try:
+    from bs4.filter import ElementFilter
+except ImportError: # beautifulsoup4 < 4.13
+    ElementFilter = None
+    from bs4 import SoupStrainer
+
+PARSER_BACKENDS = ['html.parser', 'lxml', 'selectolax']
+# Subtrees the extractors actually read: <head> metadata, the post header and
+# the article body (GAME INFO block and download buttons live in there)
+SCOPE_SELECTOR = ("title, meta[property='article:published_time'], script[type='application/ld+json'], "
+                  "article, h1.entry-title, div.post-inner, div.single-post-meta")
+
+# Patterns used by the extraction fallbacks, compiled once per process
+DATE_KEYWORD_RE = re.compile(r'(?:Published|Released|Date|Posted on):?\s*([A-Za-z]+\s+\d{1,2},\s+\d{4})', re.IGNORECASE)
+DATE_TEXT_RE = re.compile(r'[A-Za-z]+\s+\d{1,2},\s+\d{4}')
+DATE_CAPTURE_RE = re.compile(r'([A-Za-z]+\s+\d{1,2},\s+\d{4})')
+SIZE_TEXT_RE = re.compile(r'(?:Game Size|Size):\s*([^<\n]+(?:GB|MB|TB|KB))', re.IGNORECASE)
+SIZE_KEYWORDS = ['Game Size:', 'Size:']
+SIZE_STRONG_RES = [re.compile(r'^\s*' + re.escape(keyword) + r'\s*$', re.IGNORECASE) for keyword in SIZE_KEYWORDS]
+SHORTC_BUTTON_RE = re.compile(r'shortc-button', re.IGNORECASE)
+DOWNLOAD_HERE_RE = re.compile(r'DOWNLOAD HERE', re.IGNORECASE)
+DOWNLOAD_SECTION_RE = re.compile(r'(download|links|buttons|mirror)', re.IGNORECASE)
+DOWNLOAD_SECTION_KEYWORDS = ['download', 'mirror', 'link']
+KNOWN_HOSTS = ['megadb.net', 'pixeldrain.com', 'gofile.io', '1fichier.com', 'mega.nz', 'buzzheavier.com', 'datanodes.to']
+DATE_SKIP_PARENTS = ['script', 'style', 'a', 'title']
+
+
+def class_matches(tag, value):
+    """Match a tag's class attribute the way BeautifulSoup's class_ filter does."""
+    classes = tag.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    joined = ' '.join(classes)
+    if isinstance(value, str):
+        return value in classes or joined == value
+    return any(value.search(css_class) for css_class in classes) or bool(value.search(joined))
+
+
+def parser_available(parser):
+    """Whether the optional package behind a parser backend is installed."""
+    if parser == 'html.parser':
+        return True
+    if parser in ('lxml', 'selectolax'):
+        return importlib.util.find_spec(parser) is not None
+    return False
+
+
+def in_scope(name, attrs):
+    """Whether a top-level tag starts one of the subtrees in SCOPE_SELECTOR."""
+    if name in ('title', 'article'):
+        return True
+    if name == 'meta':
+        return attrs.get('property') == 'article:published_time'
+    if name == 'script':
+        return attrs.get('type') == 'application/ld+json'
+    if name in ('h1', 'div'):
+        classes = attrs.get('class') or ''
+        if isinstance(classes, str):
+            classes = classes.split()
+        if name == 'h1':
+            return 'entry-title' in classes
+        return 'post-inner' in classes or 'single-post-meta' in classes
+    return False
+
+
+if ElementFilter is not None:
+    class ScopeFilter(ElementFilter):
+        """Only build the SCOPE_SELECTOR subtrees while parsing."""
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return in_scope(name, attrs or {})
+
+        def allow_string_creation(self, string):
+            return False
+
+    SCOPE_STRAINER = ScopeFilter()
+else:
+    SCOPE_STRAINER = SoupStrainer(in_scope)
+
+
+def scoped_fragment(content):
+    """Cut the SCOPE_SELECTOR subtrees out of a page with selectolax (Lexbor)."""
+    try:
+        from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    except ImportError:
+        from selectolax.parser import HTMLParser
+
+    taken = set()
+    fragments = []
+    for node in HTMLParser(content).css(SCOPE_SELECTOR):
+        # Keep outermost matches only, like parse_only does
+        parent = node.parent
+        while parent is not None and parent.mem_id not in taken:
+            parent = parent.parent
+        if parent is None:
+            taken.add(node.mem_id)
+            fragments.append(node.html)
+    return ''.join(fragments)
+
+
+def full_parser(parser):
+    """BeautifulSoup tree builder to use when a scoped parse must be redone in full."""
+    if parser == 'selectolax':
+        return 'lxml' if parser_available('lxml') else 'html.parser'
+    return parser
+
+
+def make_soup(content, parser='html.parser', scoped=False):
+    """
+    Parse HTML with the selected backend.
+    - html.parser / lxml: BeautifulSoup tree builders; scoped=True only builds
+      the SCOPE_SELECTOR subtrees
+    - selectolax: Lexbor cuts out the SCOPE_SELECTOR subtrees first and only
+      that fragment goes through BeautifulSoup, so it is always scoped
+    Scoped parsing assumes the post header, GAME INFO block and download
+    buttons sit inside those subtrees (they do in the site theme); callers
+    re-parse in full when PageSignals.needs_full_document() says so.
+    """
+    if parser == 'selectolax':
+        return BeautifulSoup(scoped_fragment(content), full_parser(parser))
+    if scoped:
+        return BeautifulSoup(content, parser, parse_only=SCOPE_STRAINER)
+    return BeautifulSoup(content, parser)
+
+
+def select_hrefs(content, selector, parser='html.parser'):
+    """Return the href of every element matching a CSS selector, in document order."""
+    if parser == 'selectolax':
+        try:
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:
+            from selectolax.parser import HTMLParser
+        return [node.attributes.get('href') for node in HTMLParser(content).css(selector)]
+    soup = content if isinstance(content, BeautifulSoup) else BeautifulSoup(content, parser)
+    return [tag['href'] for tag in soup.select(selector)]
+
+
+class PageSignals:
+    """
+    Single-pass extraction engine for a game page.
+
+    The constructor walks the parsed document once and records every candidate
+    the extractors can use (title tags, JSON-LD, date meta/spans, GAME INFO
+    headings, size labels, links, download sections and text nodes). The
+    title/upload_date/file_size/download_urls methods then apply the same
+    priority order extract_game_details has always used to those candidates.
+    """
+
+    def __init__(self, soup):
+        self.entry_title = None
+        self.post_inner = None
+        self.title_tag = None
+        self.json_ld = None
+        self.meta_date = None
+        self.date_span = None
+        self.post_meta_div = None
+        self.h4_tags = []
+        self.size_strongs = [None] * len(SIZE_KEYWORDS)
+        self.button_links = []
+        self.download_here_links = []
+        self.href_links = []
+        self.section_tags = []
+        self.block_tags = []
+        self.strings = []
+        # Set once an extractor falls back to a whole-document search, which a
+        # scoped parse cannot answer (see needs_full_document)
+        self.document_wide = False
+        # Fallback each extractor ended up using, e.g. {'upload_date': 'json_ld'}
+        self.levels = {}
+
+        for node in soup.descendants:
+            if isinstance(node, NavigableString):
+                self.strings.append(node)
+                continue
+            name = node.name
+            if name == 'a':
+                if class_matches(node, SHORTC_BUTTON_RE):
+                    self.button_links.append(node)
+                if node.string and DOWNLOAD_HERE_RE.search(node.string):
+                    self.download_here_links.append(node)
+                if node.has_attr('href'):
+                    self.href_links.append(node)
+            elif name == 'div' or name == 'p':
+                self.block_tags.append(node)
+                if class_matches(node, DOWNLOAD_SECTION_RE):
+                    self.section_tags.append(node)
+                if name == 'div':
+                    if self.post_inner is None and class_matches(node, 'post-inner'):
+                        self.post_inner = node
+                    if self.post_meta_div is None and class_matches(node, 'single-post-meta'):
+                        self.post_meta_div = node
+            elif name == 'strong':
+                string = node.string
+                if string is not None:
+                    for i, pattern in enumerate(SIZE_STRONG_RES):
+                        if self.size_strongs[i] is None and pattern.search(string):
+                            self.size_strongs[i] = node
+            elif name == 'span':
+                if self.date_span is None and class_matches(node, 'date meta-item tie-icon'):
+                    self.date_span = node
+            elif name == 'h4':
+                self.h4_tags.append(node)
+            elif name == 'h1':
+                if self.entry_title is None and class_matches(node, 'entry-title'):
+                    self.entry_title = node
+            elif name == 'title':
+                if self.title_tag is None:
+                    self.title_tag = node
+            elif name == 'meta':
+                if self.meta_date is None and node.get('property') == 'article:published_time':
+                    self.meta_date = node
+            elif name == 'script':
+                if self.json_ld is None and node.get('type') == 'application/ld+json':
+                    self.json_ld = node
+
+    def needs_full_document(self):
+        """Whether a scoped parse hit a whole-document fallback and must be redone in full."""
+        return self.document_wide
+
+    def title(self, game_url):
+        if self.entry_title:
+            self.levels['title'] = 'entry_title'
+            return self.entry_title.text.strip()
+
+        title_str = None
+        # Try another common pattern for titles if the first fails
+        if self.post_inner:
+            title_h1_alt = self.post_inner.find("h1")
+            if title_h1_alt:
+                title_str = title_h1_alt.text.strip()
+                self.levels['title'] = 'post_inner_h1'
+
+        if not title_str:
+            # Attempt to use the <title> tag from HTML head as a last resort
+            if self.title_tag and self.title_tag.string:
+                self.levels['title'] = 'title_tag'
+                # Often page titles have "» Site Name", try to clean it
+                page_title_full = self.title_tag.string.strip()
+                title_str = page_title_full.split('»')[0].strip() # Heuristic
+                if title_str:
+                    log.warning(f"Warning: Used HTML <title> tag for game title: '{title_str}' from '{page_title_full}' for {game_url}",
+                                extra=fields(event='title_from_title_tag', url=game_url, title=title_str))
+                else: # If split fails or results in empty
+                    title_str = page_title_full # Use full page title
+                    log.warning(f"Warning: Used full HTML <title> tag as game title: '{title_str}' for {game_url}",
+                                extra=fields(event='title_from_title_tag', url=game_url, title=title_str))
+        if not title_str:
+            self.levels['title'] = 'none'
+        return title_str or None # None when no title can be derived at all
+
+    def upload_date(self, game_url):
+        # 1. JSON-LD script tag
+        if self.json_ld and self.json_ld.string:
+            try:
+                ld_data = json.loads(self.json_ld.string)
+                upload_date_str = ld_data.get('datePublished') or ld_data.get('dateModified')
+                if upload_date_str:
+                    self.levels['upload_date'] = 'json_ld'
+                    return upload_date_str
+            except json.JSONDecodeError:
+                log.warning(f"Warning: Could not parse JSON-LD from {game_url}",
+                            extra=fields(event='bad_json_ld', url=game_url))
+
+        # 2. article:published_time meta tag
+        if self.meta_date and self.meta_date.get('content'):
+            self.levels['upload_date'] = 'meta_published_time'
+            return self.meta_date['content']
+
+        # 3. <span class="date meta-item tie-icon">December 23, 2024</span>
+        if self.date_span and self.date_span.get_text(strip=True):
+            self.levels['upload_date'] = 'date_span'
+            return self.date_span.get_text(strip=True)
+        elif self.post_meta_div: # Check within post-meta as well
+            date_span_in_meta = self.post_meta_div.find('span', class_='date meta-item tie-icon')
+            if date_span_in_meta and date_span_in_meta.get_text(strip=True):
+                self.levels['upload_date'] = 'post_meta_span'
+                return date_span_in_meta.get_text(strip=True)
+
+        # 4. Text elements with a date keyword
+        self.document_wide = True
+        for text in self.strings:
+            if DATE_KEYWORD_RE.search(text):
+                match = DATE_CAPTURE_RE.search(text)
+                if match:
+                    self.levels['upload_date'] = 'keyword_text'
+                    return match.group(1)
+
+        # 5. Last resort general date regex, skipping long strings, script/style content, links and titles
+        for text in self.strings:
+            if DATE_TEXT_RE.search(text) and text.parent.name not in DATE_SKIP_PARENTS and len(text.strip()) < 30:
+                match = DATE_CAPTURE_RE.search(text)
+                if match:
+                    self.levels['upload_date'] = 'date_text'
+                    return match.group(1)
+        self.levels['upload_date'] = 'none'
+        return None
+
+    def file_size(self):
+        # 1. <h4>GAME INFO</h4> followed by <li><strong>Game Size: </strong>...</li>
+        game_info_heading = next((tag for tag in self.h4_tags if 'GAME INFO' in tag.get_text(strip=True).upper()), None)
+        if game_info_heading:
+            ul_container = game_info_heading.find_next_sibling('div', class_='plus tie-list-shortcode')
+            if ul_container:
+                ul_actual = ul_container.find('ul')
+                if ul_actual:
+                    for li in ul_actual.find_all('li'):
+                        strong_tag = li.find('strong')
+                        if strong_tag and 'Game Size:' in strong_tag.get_text(strip=True):
+                            file_size_str = ''.join(sibling.string.strip() for sibling in strong_tag.next_siblings if sibling.string and sibling.string.strip())
+                            if not file_size_str:
+                                file_size_str = li.get_text(strip=True).replace(strong_tag.get_text(strip=True), '').strip()
+                            if file_size_str:
+                                self.levels['file_size'] = 'game_info'
+                                return file_size_str
+                            break
+
+        # 2. <strong>Game Size:</strong> / <strong>Size:</strong> labels
+        self.document_wide = True
+        for size_element_strong in self.size_strongs:
+            if not size_element_strong:
+                continue
+            # The size is usually the text node immediately following the <strong> tag
+            text_after_strong = ""
+            for sibling in size_element_strong.next_siblings:
+                if isinstance(sibling, str) and sibling.strip():
+                    text_after_strong = sibling.strip()
+                    break
+                # Sometimes it's wrapped in another tag like <span> or just text within <li>
+                elif hasattr(sibling, 'get_text') and sibling.get_text(strip=True):
+                    text_after_strong = sibling.get_text(strip=True)
+                    break
+
+            if text_after_strong and any(char.isdigit() for char in text_after_strong):
+                self.levels['file_size'] = 'size_label'
+                return text_after_strong
+            elif size_element_strong.parent: # Fallback to parent's text if direct sibling fails
+                parent_text = size_element_strong.parent.get_text(strip=True)
+                value_part = parent_text.replace(size_element_strong.get_text(strip=True), '').strip()
+                if value_part and any(char.isdigit() for char in value_part):
+                    self.levels['file_size'] = 'size_label_parent'
+                    return value_part
+
+        # 3. Broader search in text nodes
+        for text in self.strings:
+            if SIZE_TEXT_RE.search(text):
+                self.levels['file_size'] = 'size_text'
+                return SIZE_TEXT_RE.search(text).group(1).strip()
+        self.levels['file_size'] = 'none'
+        return None
+
+    def download_urls(self):
+        download_urls = []
+        # 1. <a class="shortc-button ..."> or links with text "DOWNLOAD HERE"
+        for link_element in self.button_links or self.download_here_links:
+            href = link_element.get('href')
+            if href and (href.startswith('http') or href.startswith('magnet')):
+                if 'javascript:void(0)' not in href.lower():
+                    download_urls.append(href)
+        level = 'buttons'
+
+        # 2. Any link to a known file host
+        if not download_urls:
+            level = 'known_hosts'
+            self.document_wide = True
+            for a_tag in self.href_links:
+                href = a_tag['href']
+                if href and (any(host in href for host in KNOWN_HOSTS)) and 'javascript:void(0)' not in href.lower():
+                    download_urls.append(href)
+
+        # 3. Links inside download sections
+        if not download_urls:
+            level = 'download_sections'
+            download_sections = self.section_tags
+            if not download_sections:
+                download_sections = [tag for tag in self._outermost(self.block_tags)
+                                     if any(keyword in tag.get_text().lower() for keyword in DOWNLOAD_SECTION_KEYWORDS)]
+            for section in self._outermost(download_sections):
+                for a_tag_sec in section.find_all('a', href=True):
+                    href_sec = a_tag_sec['href']
+                    if href_sec and (href_sec.startswith('http') or href_sec.startswith('magnet')):
+                        if 'javascript:void(0)' not in href_sec.lower():
+                            download_urls.append(href_sec)
+
+        self.levels['download_urls'] = level if download_urls else 'none'
+        return sorted(set(download_urls)) # Remove duplicates and sort
+
+    @staticmethod
+    def _outermost(tags):
+        """
+        Yield tags (in document order) that are not nested in a tag already yielded.
+
+        Only the set of collected hrefs matters, and a nested section can only
+        contribute links its matching ancestor already contributed, so skipping
+        it (and its get_text) leaves the result unchanged.
+        """
+        taken = set()
+        for tag in tags:
+            parent = tag.parent
+            while parent is not None and id(parent) not in taken:
+                parent = parent.parent
+            if parent is not None:
+                continue
+            taken.add(id(tag))
+            yield tag
@@ -0,0 +1,202 @@
+import json
+import os
+import sys
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from catalog import as_record, join_published_downloads
+from compact import write_json_outputs
+from delta import DeltaFeed
+from metrics import fields, log
+
+MAIN_FEED_FILE = 'hydrasteam.json'
+BROAD_FEED_FILE = 'hydrasteam_broad.json'
+MAIN_FEED_HOSTS = ['gofile.io'] # hydrasteam.json carries these hosts, hydrasteam_broad.json all others
+# Extra feeds as (file name, hosts), e.g. ('hydrasteam_gofile_pixeldrain.json', ['gofile.io', 'pixeldrain.com'])
+EXTRA_FEEDS = []
+
+
+@lru_cache(maxsize=1 << 18)
+def uri_host(uri):
+    """Lowercased host of a download URI ('' if it has none), interned: a catalog has only a few dozen."""
+    try:
+        return sys.intern((urlsplit(uri.strip()).hostname or '').lower())
+    except ValueError:
+        return ''
+
+
+def host_matches(host, domains):
+    """True if host is one of domains or a subdomain of one."""
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class Feed:
+    """
+    A published JSON feed: the games with at least one URI the feed accepts,
+    each listing only those URIs.
+    - hosts: accept URIs on these domains (None accepts every host)
+    - exclude_hosts: reject URIs on these domains
+    """
+
+    def __init__(self, path, name, hosts=None, exclude_hosts=None):
+        self.path = path
+        self.name = name
+        self.hosts = [host.lower() for host in hosts] if hosts else None
+        self.exclude_hosts = [host.lower() for host in exclude_hosts or []]
+
+    def accepts(self, host):
+        if self.hosts is not None and not host_matches(host, self.hosts):
+            return False
+        return not host_matches(host, self.exclude_hosts)
+
+
+class FeedRouter:
+    """Routes every game's URIs into any number of feeds in one pass over the catalog."""
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self._routes = {}
+
+    def feeds_for(self, host):
+        """Indexes of the feeds accepting a host, worked out once per host."""
+        route = self._routes.get(host)
+        if route is None:
+            route = self._routes[host] = tuple(i for i, feed in enumerate(self.feeds) if feed.accepts(host))
+        return route
+
+    def route(self, games):
+        """
+        Return one list of games per feed, in catalog order, as dicts in the JSON schema:
+        this is where GameRecords (or dicts) become the published entries.
+        """
+        outputs = [[] for _ in self.feeds]
+        for game in games:
+            game = as_record(game)
+            if not game.uris:
+                continue
+            feed_uris = {}
+            for uri in game.uris:
+                for i in self.feeds_for(uri_host(uri)):
+                    feed_uris.setdefault(i, []).append(uri)
+            for i, selected in sorted(feed_uris.items()):
+                outputs[i].append({
+                    'title': game.title,
+                    'fileSize': game.file_size,
+                    'uploadDate': game.upload_date,
+                    'uris': selected
+                })
+        return outputs
+
+
+def parse_feed_spec(spec):
+    """(file name, hosts) from a FILE=HOST[,HOST...] command line value; ValueError if malformed."""
+    file_name, _, hosts = spec.partition('=')
+    hosts = [host.strip() for host in hosts.split(',') if host.strip()]
+    if not file_name or not hosts:
+        raise ValueError(f"--feed expects FILE=HOST[,HOST...], got '{spec}'.")
+    return file_name, hosts
+
+
+def feed_paths(output_dir):
+    """Paths of the main and broad feeds in an output directory."""
+    return os.path.join(output_dir, MAIN_FEED_FILE), os.path.join(output_dir, BROAD_FEED_FILE)
+
+
+def load_existing_downloads(filepath):
+    try:
+        if os.path.exists(filepath):
+            with open(filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                # Check if the data is a dictionary with a 'downloads' key
+                if isinstance(data, dict) and 'downloads' in data and isinstance(data['downloads'], list):
+                    log.info(f"Loaded {len(data['downloads'])} existing downloads from {filepath}",
+                             extra=fields(event='feed_loaded', path=filepath, games=len(data['downloads'])))
+                    return data['downloads']
+                # If the file exists but has invalid format, log a warning
+                elif isinstance(data, list):
+                    log.warning(f"Warning: {filepath} contains a list directly. Converting to new format.",
+                                extra=fields(event='feed_legacy_format', path=filepath))
+                    return data
+                else:
+                    log.warning(f"Warning: {filepath} has an unexpected format. Starting with an empty list.",
+                                extra=fields(event='feed_bad_format', path=filepath))
+                    return []
+        else:
+            log.info(f"No existing file found at {filepath}. Starting with an empty list.",
+                     extra=fields(event='feed_missing', path=filepath))
+            return []
+    except json.JSONDecodeError as e:
+        log.error(f"Error decoding JSON from {filepath}: {e}. Starting with an empty list.",
+                  extra=fields(event='feed_error', path=filepath, error=str(e)))
+        return []
+    except Exception as e:
+        log.error(f"Error loading {filepath}: {e}. Starting with an empty list.",
+                  extra=fields(event='feed_error', path=filepath, error=str(e)))
+        return []
+
+
+def publish_delta(delta_dir, filepath, downloads):
+    """Record what changed in a feed since the version currently on disk."""
+    feed = DeltaFeed(delta_dir, os.path.splitext(os.path.basename(filepath))[0])
+    entry = feed.publish(load_existing_downloads(filepath), downloads)
+    if entry:
+        log.info(f"🧾 Delta {entry['from']} -> {entry['to']}: {entry['added']} added, {entry['updated']} updated, "
+                 f"{entry['removed']} removed ({entry['bytes']} bytes)",
+                 extra=fields(event='delta', feed=feed.feed_name, **entry))
+
+
+def build_feeds(filepath, broad_filepath=None, extra_feeds=None):
+    """
+    The feeds save_downloads publishes:
+    - hydrasteam.json: games with gofile links (only gofile links included)
+    - hydrasteam_broad.json: games with any other links (gofile links left out)
+    - one more per (file name, hosts) in extra_feeds, written next to filepath
+    """
+    feeds = []
+    if filepath:
+        feeds.append(Feed(filepath, "HydraSteam", hosts=MAIN_FEED_HOSTS))
+    if broad_filepath:
+        feeds.append(Feed(broad_filepath, "HydraSteam Broad", exclude_hosts=MAIN_FEED_HOSTS))
+    output_dir = os.path.dirname(filepath or broad_filepath or MAIN_FEED_FILE)
+    for file_name, hosts in EXTRA_FEEDS if extra_feeds is None else extra_feeds:
+        feeds.append(Feed(os.path.join(output_dir, file_name), f"HydraSteam {' + '.join(hosts)}", hosts=hosts))
+    return feeds
+
+
+def save_downloads(filepath, downloads_data, broad_filepath=None, delta_dir=None, extra_feeds=None):
+    """
+    Save the downloads data to one JSON file per feed (see build_feeds).
+    Every game's links are routed to all feeds in a single pass, so extra feeds cost no extra pass over the catalog.
+    With delta_dir, the changes against the files being replaced are also published as deltas.
+    """
+    try:
+        feeds = build_feeds(filepath, broad_filepath, extra_feeds)
+        for feed, downloads in zip(feeds, FeedRouter(feeds).route(downloads_data)):
+            if not downloads:
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(feed.path)), exist_ok=True)
+            # Create the output structure with name first
+            output = {
+                "name": feed.name,
+                "downloads": downloads
+            }
+            if delta_dir:
+                publish_delta(delta_dir, feed.path, downloads)
+            write_json_outputs(feed.path, output)
+            log.info(f"✅ Saved {len(downloads)} items to {feed.path}",
+                     extra=fields(event='feed_saved', path=feed.path, games=len(downloads)))
+            
+        return True
+        
+    except Exception as e:
+        log.error(f"❌ Error saving files: {e}", extra=fields(event='save_error', error=str(e)))
+        return False
+
+
+def load_published_catalog(main_json_path, broad_json_path):
+    """
+    The full catalog as last published: each feed only carries some of a game's links
+    (and broad-only games are missing from hydrasteam.json), so both are joined per game.
+    """
+    return join_published_downloads(load_existing_downloads(main_json_path),
+                                    load_existing_downloads(broad_json_path))
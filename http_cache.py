@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+class HttpCache:
+    """
+    On-disk store of response bodies with their ETag/Last-Modified validators.
+
+    Each URL is stored as <sha256>.body plus a <sha256>.json metadata file. An
+    entry's file mtime is its last use (store or successful revalidation), which
+    drives both eviction rules:
+    - entries unused for longer than max_age seconds are dropped
+    - when the bodies exceed max_bytes, least recently used entries go first
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+        self.evict()
+
+    def _key(self, url):
+        return os.path.join(self.path, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _entries(self):
+        """Yield (key path, last used time, body size) for every stored entry."""
+        for name in os.listdir(self.path):
+            if name.endswith('.body'):
+                key = os.path.join(self.path, name[:-5])
+                try:
+                    stat = os.stat(key + '.body')
+                except FileNotFoundError:
+                    continue
+                yield key, stat.st_mtime, stat.st_size
+
+    def get(self, url):
+        """Return (metadata, body) for a cached URL, or None."""
+        key = self._key(url)
+        try:
+            with open(key + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(key + '.body', 'rb') as f:
+                body = f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if meta.get('url') != url or time.time() - os.path.getmtime(key + '.body') > self.max_age:
+            return None
+        return meta, body
+
+    def store(self, url, headers, body):
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time()
+        }
+        key = self._key(url)
+        with self.lock:
+            self._remove(key)
+            # Write via temp files so a crash never leaves a torn entry
+            for suffix, mode, data in (('.body', 'wb', body), ('.json', 'w', json.dumps(meta))):
+                tmp_path = f"{key}{suffix}.{threading.get_ident()}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(data)
+                os.replace(tmp_path, key + suffix)
+            self.total_bytes += len(body)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def touch(self, url):
+        """Mark an entry as just revalidated."""
+        try:
+            os.utime(self._key(url) + '.body')
+        except FileNotFoundError:
+            pass
+
+    def discard(self, url):
+        with self.lock:
+            self._remove(self._key(url))
+
+    def _remove(self, key):
+        try:
+            self.total_bytes -= os.path.getsize(key + '.body')
+            os.remove(key + '.body')
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(key + '.json')
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        with self.lock:
+            now = time.time()
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            for key, last_used, _ in entries:
+                if now - last_used > self.max_age or self.total_bytes > self.max_bytes:
+                    self._remove(key)
+
+
+class CachingAdapter(HTTPAdapter):
+    """
+    Transport adapter that revalidates cached GETs with If-None-Match /
+    If-Modified-Since and answers 304s with the body stored on disk.
+    Responses served from the cache carry an X-Cache: revalidated header.
+    """
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.stats = {'revalidated': 0, 'stored': 0, 'uncacheable': 0}
+        self.stats_lock = threading.Lock() # send() runs on every fetch thread
+
+    def count(self, outcome):
+        with self.stats_lock:
+            self.stats[outcome] += 1
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        entry = self.cache.get(request.url)
+        if entry:
+            meta, _ = entry
+            if meta.get('etag'):
+                request.headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request.headers['If-Modified-Since'] = meta['last_modified']
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            _, body = entry
+            response.status_code = 200
+            response.reason = 'OK'
+            response._content = body
+            response.headers['X-Cache'] = 'revalidated'
+            self.cache.touch(request.url)
+            self.count('revalidated')
+        elif response.status_code == 200:
+            if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+                self.cache.store(request.url, response.headers, response.content)
+                self.count('stored')
+            else:
+                # Nothing to revalidate against next time
+                if entry:
+                    self.cache.discard(request.url)
+                self.count('uncacheable')
+        return response
+
+
+def install_cache(session, cache_dir, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+    """Mount a CachingAdapter backed by cache_dir on a requests.Session and return the adapter."""
+    adapter = CachingAdapter(HttpCache(cache_dir, max_bytes, max_age))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
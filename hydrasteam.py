@@ -0,0 +1,225 @@
+"""
+HydraSteam command line.
+
+    hydrasteam.py scrape [options]    scrape SteamRIP and update the feeds
+    hydrasteam.py daemon [options]    keep the feeds fresh with a long-running refresh loop
+    hydrasteam.py split [feeds]       split feeds into chunks with a manifest
+    hydrasteam.py export [options]    rewrite the feeds from the catalog database or the published files
+    hydrasteam.py stats [options]     summarize the published feeds
+    hydrasteam.py publish [options]   commit and push the published files
+    hydrasteam.py serve [options]     serve the published files over HTTP
+    hydrasteam.py search QUERY        find games by title (prefix, words or typos)
+
+Only the chosen subcommand's modules are imported, so split/stats/export/publish/serve/search
+start without loading requests, BeautifulSoup or dateutil.
+"""
+import argparse
+import json
+import os
+import sys
+
+PROG = 'hydrasteam'
+
+
+def cmd_scrape(argv):
+    import steamrip_scraper
+    return steamrip_scraper.cli(argv, prog=f"{PROG} scrape")
+
+
+def cmd_daemon(argv):
+    import daemon
+    return daemon.main(argv, prog=f"{PROG} daemon")
+
+
+def cmd_serve(argv):
+    import server
+    return server.main(argv, prog=f"{PROG} serve")
+
+
+def cmd_search(argv):
+    import search
+    return search.main(argv, prog=f"{PROG} search")
+
+
+def cmd_split(argv):
+    import main as splitter
+    return splitter.main(argv, prog=f"{PROG} split")
+
+
+def cmd_export(argv):
+    parser = argparse.ArgumentParser(prog=f"{PROG} export",
+                                     description="Rewrite the feeds (and their variants and deltas) from the catalog.")
+    parser.add_argument('--db', help='Export from this SQLite catalog database (default: the published feeds themselves).')
+    parser.add_argument('--output-dir', default='.', help='Directory holding the feeds.')
+    parser.add_argument('--feed', action='append', default=[], metavar='FILE=HOST[,HOST...]',
+                        help='Also export a feed of these hosts\' links (repeatable).')
+    parser.add_argument('--no-deltas', action='store_true', help='Do not publish deltas for the changes.')
+    parser.add_argument('--split', action='store_true', help='Regenerate split_files/ afterwards.')
+    args = parser.parse_args(argv)
+
+    from feeds import build_feeds, feed_paths, load_published_catalog, parse_feed_spec, save_downloads
+    from metrics import configure_logging, fields, log
+    configure_logging()
+    try:
+        extra_feeds = [parse_feed_spec(spec) for spec in args.feed]
+    except ValueError as e:
+        parser.error(str(e))
+    main_path, broad_path = feed_paths(args.output_dir)
+    store = None
+    if args.db:
+        from catalog_db import CatalogStore
+        store = games = CatalogStore(args.db)
+    else:
+        games = load_published_catalog(main_path, broad_path)
+    try:
+        if not len(games):
+            log.error("❌ The catalog is empty; nothing to export.", extra=fields(event='export_empty'))
+            return 1
+        delta_dir = None if args.no_deltas else os.path.join(args.output_dir, 'deltas')
+        if not save_downloads(main_path, games, broad_path, delta_dir, extra_feeds or None):
+            return 1
+    finally:
+        if store is not None:
+            store.close()
+    if args.split:
+        import main as splitter
+        feeds = build_feeds(main_path, broad_path, extra_feeds or None)
+        splitter.split_feeds([feed.path for feed in feeds], os.path.join(args.output_dir, 'split_files'))
+    return 0
+
+
+def feed_stats(path):
+    """Games, links per host and on-disk sizes of one published feed."""
+    from compact import variant_paths
+    from feeds import uri_host
+    with open(path, 'r', encoding='utf-8') as f:
+        downloads = json.load(f).get('downloads', [])
+    hosts = {}
+    for game in downloads:
+        for uri in game.get('uris', []):
+            host = uri_host(uri)
+            hosts[host] = hosts.get(host, 0) + 1
+    sizes = {os.path.basename(candidate): os.path.getsize(candidate)
+             for candidate in [path] + variant_paths(path) if os.path.exists(candidate)}
+    return {'games': len(downloads), 'uris': sum(hosts.values()),
+            'hosts': dict(sorted(hosts.items(), key=lambda item: -item[1])), 'bytes': sizes}
+
+
+def collect_stats(output_dir, feed_files):
+    stats = {'feeds': {}}
+    for file_name in feed_files:
+        path = os.path.join(output_dir, file_name)
+        if not os.path.exists(path):
+            continue
+        name = os.path.splitext(file_name)[0]
+        entry = feed_stats(path)
+        manifest_path = os.path.join(output_dir, 'split_files', name, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            entry['split'] = {'version': manifest.get('version'), 'chunks': len(manifest.get('chunks', [])),
+                              'updated': manifest.get('updated')}
+        index_path = os.path.join(output_dir, 'deltas', name, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            entry['deltas'] = {'version': index.get('version'), 'chain': len(index.get('deltas', []))}
+        stats['feeds'][file_name] = entry
+    report_path = os.path.join(output_dir, 'run_report.json')
+    if os.path.exists(report_path):
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        stats['last_run'] = dict(report.get('run', {}), **report.get('totals', {}))
+    return stats
+
+
+def cmd_stats(argv):
+    parser = argparse.ArgumentParser(prog=f"{PROG} stats", description="Summarize the published feeds.")
+    parser.add_argument('feeds', nargs='*', default=['hydrasteam.json', 'hydrasteam_broad.json'],
+                        help='Feed files in --output-dir (default: hydrasteam.json hydrasteam_broad.json).')
+    parser.add_argument('--output-dir', default='.', help='Directory holding the feeds.')
+    parser.add_argument('--json', action='store_true', help='Print the statistics as JSON.')
+    args = parser.parse_args(argv)
+
+    stats = collect_stats(args.output_dir, args.feeds)
+    if not stats['feeds']:
+        print(f"❌ No feeds found in {args.output_dir}")
+        return 1
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return 0
+    for file_name, entry in stats['feeds'].items():
+        print(f"📦 {file_name}: {entry['games']} games, {entry['uris']} links")
+        print("   hosts: " + ", ".join(f"{host} {count}" for host, count in entry['hosts'].items()))
+        print("   files: " + ", ".join(f"{name} {size / 1024:.0f} KiB" for name, size in entry['bytes'].items()))
+        if 'split' in entry:
+            print(f"   split: {entry['split']['chunks']} chunks, version {entry['split']['version']}")
+        if 'deltas' in entry:
+            print(f"   deltas: {entry['deltas']['chain']} in chain, version {entry['deltas']['version']}")
+    if 'last_run' in stats:
+        run = stats['last_run']
+        print(f"🕒 Last run {run.get('started')}: {run.get('added', 0)} added, {run.get('updated', 0)} updated, "
+              f"{run.get('pending', 0)} pending, {run.get('seconds', 0):.0f}s")
+    return 0
+
+
+def cmd_publish(argv):
+    parser = argparse.ArgumentParser(prog=f"{PROG} publish",
+                                     description="Commit and push the feeds, their variants, split_files/ and deltas/.")
+    parser.add_argument('--output-dir', default='.', help='Directory holding the feeds.')
+    parser.add_argument('--feed', action='append', default=[], metavar='FILE=HOST[,HOST...]',
+                        help='Also publish this extra feed (repeatable).')
+    parser.add_argument('-m', '--message', default='Update game list.', help='Commit message.')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be committed and stop.')
+    args = parser.parse_args(argv)
+
+    from feeds import build_feeds, feed_paths, parse_feed_spec
+    from metrics import configure_logging
+    from publish import git_commit_and_push, published_paths
+    configure_logging()
+    try:
+        extra_feeds = [parse_feed_spec(spec) for spec in args.feed]
+    except ValueError as e:
+        parser.error(str(e))
+    main_path, broad_path = feed_paths(args.output_dir)
+    paths = published_paths(build_feeds(main_path, broad_path, extra_feeds or None), args.output_dir)
+    if args.dry_run:
+        print("\n".join(paths))
+        return 0
+    return 0 if git_commit_and_push(paths, args.message) else 1
+
+
+COMMANDS = {
+    'scrape': (cmd_scrape, 'scrape SteamRIP and update the feeds'),
+    'daemon': (cmd_daemon, 'keep the feeds fresh with a long-running refresh loop'),
+    'split': (cmd_split, 'split feeds into chunks with a manifest'),
+    'export': (cmd_export, 'rewrite the feeds from the catalog database or the published files'),
+    'stats': (cmd_stats, 'summarize the published feeds'),
+    'publish': (cmd_publish, 'commit and push the published files'),
+    'serve': (cmd_serve, 'serve the published files over HTTP'),
+    'search': (cmd_search, 'find games by title (prefix, words or typos)'),
+}
+
+
+def usage():
+    lines = [f"usage: {PROG} <command> [options]", "", "commands:"]
+    lines += [f"  {name:<9} {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", f"Run '{PROG} <command> --help' for the options of a command."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Dispatch on the command name before building any parser, so only that command's imports are paid for
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"{PROG}: unknown command '{argv[0]}'\n\n{usage()}", file=sys.stderr)
+        return 2
+    return command[0](argv[1:]) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import json
+import os
+
+from metrics import fields, log
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL log of the games upserted during a run.
+
+    Each upsert is one line, flushed and synced to disk as soon as it is written, so
+    checkpointing costs O(1) per game instead of rewriting the published JSON files. After the
+    JSON files have been saved the journal is compacted (removed). A journal
+    still on disk at startup belongs to a run that did not finish and is
+    replayed onto the loaded catalog.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.entries = 0
+
+    def replay(self):
+        """Yield the games recorded by an unfinished run. A torn last line is ignored."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    game = json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning(f"Warning: Ignoring unreadable journal entry {line_number} in {self.path}",
+                                extra=fields(event='journal_bad_entry', path=self.path, line=line_number))
+                    continue
+                if isinstance(game, dict):
+                    yield game
+
+    def append(self, game):
+        if self.file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.drop_torn_tail()
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(game, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.entries += 1
+
+    def drop_torn_tail(self):
+        """
+        Cut off a last line left unterminated by a crash (replay already skips it), so
+        the next entry starts on a line of its own instead of being glued onto it.
+        """
+        try:
+            f = open(self.path, 'r+b')
+        except FileNotFoundError:
+            return
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            if not end:
+                return
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                block = f.read(position - start)
+                if position == end and block.endswith(b'\n'):
+                    return # Nothing torn
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            log.warning(f"Warning: Dropping a torn entry at the end of {self.path}",
+                        extra=fields(event='journal_torn_tail', path=self.path, bytes=end - position))
+            f.truncate(position)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def compact(self):
+        """Drop the journal once its games have been folded into the published JSON."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.entries = 0
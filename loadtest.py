@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from server import raise_open_file_limit
+
+try:
+    import brotli
+except ImportError: # Optional: br responses are only checked when it is installed
+    brotli = None
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hydrasteam.py')
+# Request kinds a simulated launcher sends, with their weights and the status each must get
+MIX = [('revalidate', 5, 304), ('gzip', 2, 200), ('br', 2, 200), ('full', 1, 200), ('range', 1, 206)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_synthetic_catalog(output_dir, games):
+    """Publish a synthetic catalog (feeds, variants and chunks) to serve when no --output-dir is given."""
+    from benchmark import make_synthetic_games
+    from feeds import feed_paths, save_downloads
+    import main as splitter
+
+    main_path, broad_path = feed_paths(output_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_downloads(main_path, make_synthetic_games(games), broad_path)
+        splitter.split_feeds([main_path, broad_path], os.path.join(output_dir, 'split_files'))
+
+
+async def request(reader, writer, host, path, headers=()):
+    """Send one keep-alive GET and return (status, headers, body)."""
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}"] + [f"{name}: {value}" for name, value in headers]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    response_headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+    length = int(response_headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return int(status_line.split(' ')[1]), response_headers, body
+
+
+def request_headers(kind, resource):
+    if kind == 'revalidate':
+        return [('Accept-Encoding', 'gzip, br'), ('If-None-Match', resource['etags']['br' if brotli else 'gzip'])]
+    if kind == 'gzip':
+        return [('Accept-Encoding', 'gzip')]
+    if kind == 'br':
+        return [('Accept-Encoding', 'br')]
+    if kind == 'range':
+        return [('Range', 'bytes=0-1023')]
+    return []
+
+
+async def check_resources(host, port, paths):
+    """
+    Fetch every path once each way and check the responses agree: identity, gzip and br
+    bodies decode to the same JSON, the ETag revalidates with a 304 and a range is the
+    right slice. Returns (resources for the load phase, list of problems).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    resources = {}
+    problems = []
+    try:
+        for path in paths:
+            status, headers, body = await request(reader, writer, host, path)
+            if status != 200:
+                problems.append(f"{path}: status {status}")
+                continue
+            document = json.loads(body)
+            etags = {'identity': headers['etag']}
+            for coding, decode in (('gzip', gzip.decompress), ('br', brotli.decompress if brotli else None)):
+                status, headers, encoded = await request(reader, writer, host, path, [('Accept-Encoding', coding)])
+                if headers.get('content-encoding') != coding:
+                    if decode is not None and 'vary' in headers: # Files without variants (manifests) are always sent as-is
+                        problems.append(f"{path}: no {coding} variant served")
+                    etags[coding] = headers['etag']
+                    continue
+                etags[coding] = headers['etag']
+                if decode is not None and json.loads(decode(encoded)) != document:
+                    problems.append(f"{path}: {coding} body differs from the file")
+            for coding, etag in etags.items():
+                accept = [] if coding == 'identity' else [('Accept-Encoding', coding)]
+                status, _, _ = await request(reader, writer, host, path, accept + [('If-None-Match', etag)])
+                if status != 304:
+                    problems.append(f"{path}: If-None-Match {coding} ETag got {status}, not 304")
+            status, _, part = await request(reader, writer, host, path, [('Range', 'bytes=0-1023')])
+            if status != 206 or part != body[:1024]:
+                problems.append(f"{path}: range request got {status}")
+            resources[path] = {'etags': etags, 'bytes': len(body)}
+    finally:
+        writer.close()
+    return resources, problems
+
+
+async def client(host, port, resources, requests, rng, results, connect_timeout):
+    """One launcher: a keep-alive connection sending requests of the MIX kinds."""
+    kinds, weights, _ = zip(*MIX)
+    expected = {kind: status for kind, _, status in MIX}
+    paths = list(resources)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), connect_timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        results['errors'].append(f"connect: {e!r}")
+        return
+    results['open'] += 1
+    results['peak_open'] = max(results['peak_open'], results['open'])
+    try:
+        for _ in range(requests):
+            path = rng.choice(paths)
+            kind = rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            status, _, body = await request(reader, writer, host, path, request_headers(kind, resources[path]))
+            results['latencies'].append(time.perf_counter() - start)
+            results['bytes'] += len(body)
+            results['statuses'][status] = results['statuses'].get(status, 0) + 1
+            if status != expected[kind]:
+                results['unexpected'].append(f"{kind} {path}: {status}")
+    except (OSError, asyncio.IncompleteReadError) as e:
+        results['errors'].append(f"request: {e!r}")
+    finally:
+        results['open'] -= 1
+        writer.close()
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+async def run_load(host, port, paths, clients, requests, seed, connect_timeout):
+    resources, problems = await check_resources(host, port, paths)
+    for problem in problems:
+        print(f"  FAIL: {problem}")
+    if not resources:
+        return None, problems
+
+    results = {'latencies': [], 'bytes': 0, 'statuses': {}, 'errors': [], 'unexpected': [], 'open': 0, 'peak_open': 0}
+    print(f"\n🚀 {clients} concurrent clients x {requests} keep-alive requests over {len(resources)} paths")
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, resources, requests, random.Random(seed + i), results, connect_timeout)
+                           for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(results['latencies'])
+    summary = {
+        'clients': clients, 'requests': len(latencies), 'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mib_per_second': round(results['bytes'] / 1048576 / elapsed, 2) if elapsed else None,
+        'latency_ms': {name: round(percentile(latencies, q) * 1000, 2) if latencies else None
+                       for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))},
+        'statuses': {str(status): count for status, count in sorted(results['statuses'].items())},
+        'peak_open_connections': results['peak_open'],
+        'errors': len(results['errors']), 'unexpected': len(results['unexpected']),
+    }
+    print(f"  {summary['requests']} requests in {elapsed:.2f}s: {summary['requests_per_second']} req/s, "
+          f"{summary['mib_per_second']} MiB/s, {results['peak_open']} connections open at peak")
+    print("  latency " + ", ".join(f"{name} {value} ms" for name, value in summary['latency_ms'].items()))
+    print("  statuses " + ", ".join(f"{status}: {count}" for status, count in summary['statuses'].items()))
+    for message in results['errors'][:5] + results['unexpected'][:5]:
+        print(f"  FAIL: {message}")
+    if results['errors'] or results['unexpected']:
+        problems.append(f"{len(results['errors'])} errors, {len(results['unexpected'])} unexpected statuses")
+    return summary, problems
+
+
+async def served_paths(host, port, limit):
+    """The JSON files the server lists at /, feeds first, then a sample of chunks and deltas."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, _, body = await request(reader, writer, host, '/')
+    finally:
+        writer.close()
+    paths = [path for path in json.loads(body)['files'] if path.endswith('.json') and not path.endswith('.min.json')]
+    feeds = [path for path in paths if path.count('/') == 1]
+    others = [path for path in paths if path.count('/') > 1]
+    return feeds + others[:max(0, limit - len(feeds))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test 'hydrasteam.py serve' with many concurrent keep-alive clients.")
+    parser.add_argument('--url', help='A server that is already running (default: start one for this test).')
+    parser.add_argument('--output-dir', help='Serve this directory (default: a synthetic catalog in a temp dir).')
+    parser.add_argument('--games', type=int, default=20000, help='Games in the synthetic catalog.')
+    parser.add_argument('--clients', type=int, default=1000, help='Concurrent client connections.')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client.')
+    parser.add_argument('--paths', nargs='+', help='Paths to request (default: the feeds and a sample of chunks).')
+    parser.add_argument('--max-paths', type=int, default=20, help='Paths sampled from the server\'s index.')
+    parser.add_argument('--connect-timeout', type=float, default=30.0, help='Seconds a client may wait to connect.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the request mix.')
+    parser.add_argument('--output', help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    raise_open_file_limit()
+    process = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            output_dir = args.output_dir
+            if not output_dir:
+                output_dir = tmp_dir
+                print(f"📦 Publishing a synthetic catalog of {args.games} games...")
+                write_synthetic_catalog(output_dir, args.games)
+            host, port = '127.0.0.1', free_port()
+            process = subprocess.Popen([sys.executable, CLI, 'serve', '--output-dir', output_dir, '--port', str(port),
+                                        '--log-level', 'WARNING'], stdout=subprocess.PIPE, text=True)
+            print(process.stdout.readline().rstrip())
+        try:
+            paths = args.paths or asyncio.run(served_paths(host, port, args.max_paths))
+            summary, problems = asyncio.run(run_load(host, port, paths, args.clients, args.requests, args.seed,
+                                                     args.connect_timeout))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.output and summary:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(summary, problems=problems), f, indent=2)
+    print("\n✅ All responses as expected." if not problems else f"\n❌ {len(problems)} problems.")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,436 @@
+import hashlib
+import heapq
 import json
 import os
+import re
+import sys
+import tempfile
 from pathlib import Path
+from datetime import datetime, timezone
 
-def split_json_file(input_file, output_dir, games_per_file=50):
-    """Split a JSON file containing game downloads into smaller files."""
+from compact import dumps_minified, orjson, remove_with_variants, variant_paths, write_bytes, write_variants
+from metrics import configure_logging, fields, log, logging_configured, logging_settings
+
+# Chunk limits: a chunk is closed when either one would be exceeded
+GAMES_PER_FILE = 200
+MAX_CHUNK_BYTES = 64 * 1024
+# Where the split files are published; manifest URLs are <SPLIT_FILES_URL>/<feed>/<file>
+SPLIT_FILES_URL = "https://raw.githubusercontent.com/Rieversed/HydraSteam/main/split_files"
+# A chunk under this fraction of both limits is merged into a neighbour when they fit together
+MIN_CHUNK_FILL = 0.25
+# Games sorted in memory at once; bigger inputs are sorted in runs spilled to disk
+SORT_RUN_GAMES = 50000
+READ_BLOCK_SIZE = 64 * 1024
+
+WHITESPACE_RE = re.compile(r'\s*')
+DOWNLOADS_KEY_RE = re.compile(r'"downloads"\s*:\s*\[')
+NAME_RE = re.compile(r'"name"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def iter_downloads(input_file, block_size=READ_BLOCK_SIZE):
+    """
+    Stream the games of a {"name": ..., "downloads": [...]} file one at a time.
+    Only the current block and the game being decoded are held in memory.
+    Returns a generator; a plain list file (the legacy format) works too.
+    """
+    decoder = json.JSONDecoder()
+    with open(input_file, 'r', encoding='utf-8') as f:
+        buffer = f.read(block_size)
+        # Find the start of the downloads array
+        while True:
+            match = DOWNLOADS_KEY_RE.search(buffer)
+            if match:
+                pos = match.end()
+                break
+            if buffer.lstrip().startswith('['):
+                pos = buffer.index('[') + 1
+                break
+            more = f.read(block_size)
+            if not more:
+                return
+            buffer += more
+
+        while True:
+            pos = WHITESPACE_RE.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == ',':
+                pos = WHITESPACE_RE.match(buffer, pos + 1).end()
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                game, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The game continues past the buffered text
+                more = f.read(block_size)
+                if not more:
+                    raise
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield game
+            pos = end
+            if pos > block_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def read_feed_name(input_file, default='downloads'):
+    """The feed's "name", read from the start of the file (it is written before the downloads)."""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        head = f.read(READ_BLOCK_SIZE)
+    downloads = DOWNLOADS_KEY_RE.search(head)
+    match = NAME_RE.search(head, 0, downloads.start() if downloads else len(head))
+    return json.loads(match.group(1)) if match else default
+
+
+def title_key(game):
+    return game.get('title', '').lower()
+
+
+def sorted_downloads(input_file, run_size=SORT_RUN_GAMES):
+    """
+    Yield the games of input_file sorted by title (case-insensitive, stable).
+    Inputs over run_size games are sorted in runs spilled to temporary JSONL
+    files and merged, so memory stays bounded by run_size.
+    """
+    run = []
+    run_files = []
+    try:
+        for game in iter_downloads(input_file):
+            run.append(game)
+            if len(run) >= run_size:
+                run_files.append(spill_run(run))
+                run = []
+        run.sort(key=title_key)
+        if not run_files:
+            yield from run
+            return
+        runs = [read_run(run_file) for run_file in run_files] + [iter(run)]
+        # heapq.merge keeps equal titles in input order, so the sort stays stable
+        yield from heapq.merge(*runs, key=title_key)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def spill_run(run):
+    run.sort(key=title_key)
+    run_file = tempfile.TemporaryFile('w+', encoding='utf-8')
+    for game in run:
+        run_file.write(json.dumps(game, ensure_ascii=False) + '\n')
+    run_file.seek(0)
+    return run_file
+
+
+def read_run(run_file):
+    for line in run_file:
+        yield json.loads(line)
+
+
+encode_value = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def game_fragment(game):
+    """
+    A game serialized exactly as json.dump(indent=2) nests it inside the "downloads" list.
+    orjson produces these bytes directly; without it the flat game schema is laid out
+    by hand, since json's indenting encoder is pure Python and was most of the split time.
+    """
+    if orjson is not None:
+        try:
+            return '    ' + orjson.dumps(game, option=orjson.OPT_INDENT_2).decode('utf-8').replace('\n', '\n    ')
+        except TypeError:
+            pass
+    if not game:
+        return '    {}'
+    lines = []
+    for key, value in game.items():
+        if isinstance(value, list) and not any(isinstance(item, (dict, list)) for item in value):
+            text = '[\n' + ',\n'.join('        ' + encode_value(item) for item in value) + '\n      ]' if value else '[]'
+        elif isinstance(value, (dict, list)):
+            text = json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n      ')
+        else:
+            text = encode_value(value)
+        lines.append('      ' + encode_value(str(key)) + ': ' + text)
+    return '    {\n' + ',\n'.join(lines) + '\n    }'
+
+
+def chunk_text(name, fragments):
+    return '{\n  "name": ' + json.dumps(name, ensure_ascii=False) + ',\n  "downloads": [\n' + ',\n'.join(fragments) + '\n  ]\n}'
+
+
+def chunk_minified(name, compacts):
+    return b'{"name":' + dumps_minified(name) + b',"downloads":[' + b','.join(compacts) + b']}'
+
+
+class Chunk:
+    """One chunk file: the games whose title key is >= start (up to the next chunk's start)."""
+
+    def __init__(self, part, start):
+        self.part = part
+        self.start = start
+        self.fragments = []
+        self.compacts = [] # The same games minified
+        self.last_key = None
+        self.first_title = None
+        self.last_title = None
+        self.bytes = 0 # Serialized size of the games, separators included
+        self.games = 0
+
+    def add(self, key, title, fragment, compact, size):
+        if not self.fragments:
+            self.first_title = title
+        self.fragments.append(fragment)
+        self.compacts.append(compact)
+        self.last_key = key
+        self.last_title = title
+        self.bytes += size
+
+    def release(self):
+        """Drop the serialized games once the chunk is written, keeping its metadata."""
+        self.games = len(self.fragments)
+        self.fragments = self.compacts = None
+
+    def absorb(self, other):
+        if not other.fragments:
+            return
+        if not self.fragments:
+            self.first_title = other.first_title
+        self.fragments.extend(other.fragments)
+        self.compacts.extend(other.compacts)
+        self.last_key = other.last_key
+        self.last_title = other.last_title
+        self.bytes += other.bytes
+
+
+def load_manifest(path):
+    """The manifest of the previous split, or None."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        # Validate the chunk layout up front
+        [(chunk['part'], chunk['start']) for chunk in manifest['chunks']]
+        return manifest
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        log.warning(f"Warning: Could not read {path}: {e}. Repartitioning.",
+                    extra=fields(event='manifest_error', path=str(path), error=str(e)))
+        return None
+
+
+def split_json_file(input_file, output_dir, games_per_file=GAMES_PER_FILE, max_bytes=MAX_CHUNK_BYTES,
+                    base_url=SPLIT_FILES_URL):
+    """
+    Split a JSON file containing game downloads into smaller files, sorted by title.
+
+    Chunks are title-key ranges kept in manifest.json, so a game only ever
+    lands in the chunk covering its title and an update rewrites just the
+    chunks it touches:
+    - a chunk that would go over games_per_file games or max_bytes is split,
+      the new chunk taking the next unused part number
+    - a chunk under MIN_CHUNK_FILL of both limits is merged with its neighbour
+      when the two fit together, and the emptied part file is removed
+    The input is streamed, so memory does not grow with the catalog.
+
+    manifest.json lists every chunk's URL, game count, size, title range and
+    sha256, plus a catalog version (a hash over the chunk hashes), so clients
+    only need to download the chunks whose hash changed.
+    """
     # Create output directory if it doesn't exist
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Read the input JSON file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Get the downloads list
-    downloads = data.get('downloads', [])
-    if not downloads:
-        print(f"No downloads found in {input_file}")
-        return
-    
-    # Sort downloads by title (case-insensitive)
-    downloads.sort(key=lambda x: x.get('title', '').lower())
-    
-    # Split into chunks
-    for i in range(0, len(downloads), games_per_file):
-        chunk = downloads[i:i + games_per_file]
-        
-        # Create chunk data
-        chunk_data = {
-            "name": f"{data.get('name', 'downloads')}_part_{i//games_per_file + 1}",
-            "downloads": chunk
-        }
-        
-        # Determine output filename
-        output_file = output_dir / f"{Path(input_file).stem}_part_{i//games_per_file + 1}.json"
-        
-        # Write chunk to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(chunk_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"Created {output_file} with {len(chunk)} games")
-
-def main():
-    # Configuration
-    input_files = ['hydrasteam.json', 'hydrasteam_broad.json']
-    output_base_dir = 'split_files'
-    games_per_file = 200  # Increased from 50 to 200 to create fewer, larger files
-    
-    # Process each input file
+
+    name = read_feed_name(input_file)
+    stem = Path(input_file).stem
+    manifest_file = output_dir / 'manifest.json'
+    previous = load_manifest(manifest_file)
+    layout = [(chunk['part'], chunk['start']) for chunk in previous['chunks']] if previous else None
+    # Bytes of a chunk besides its games: the wrapper object and separators
+    overhead = len(f'{{\n  "name": "{name}_part_0000",\n  "downloads": [\n\n  ]\n}}'.encode('utf-8'))
+    budget = max_bytes - overhead
+
+    existing_parts = set()
+    for path in output_dir.glob(f"{stem}_part_*.json"):
+        suffix = path.stem[len(stem) + len('_part_'):]
+        if suffix.isdigit():
+            existing_parts.add(int(suffix))
+    if layout:
+        next_part = max(existing_parts | {part for part, _ in layout}) + 1
+    else:
+        # First split: number the chunks 1, 2, ... in title order
+        layout = [(1, '')]
+        next_part = 2
+
+    def small(chunk):
+        return len(chunk.fragments) < games_per_file * MIN_CHUNK_FILL and chunk.bytes < budget * MIN_CHUNK_FILL
+
+    written = []
+    hashes = {}
+    held = None
+    stats = {'written': 0, 'unchanged': 0}
+
+    def emit(chunk):
+        output_file = output_dir / f"{stem}_part_{chunk.part}.json"
+        data = chunk_text(f"{name}_part_{chunk.part}", chunk.fragments).encode('utf-8')
+        hashes[chunk.part] = (hashlib.sha256(data).hexdigest(), len(data))
+        if write_bytes(output_file, data, only_if_changed=True):
+            write_variants(output_file, chunk_minified(f"{name}_part_{chunk.part}", chunk.compacts))
+            stats['written'] += 1
+            log.info(f"Wrote {output_file} with {len(chunk.fragments)} games ({chunk.bytes + overhead} bytes)",
+                     extra=fields(event='chunk_written', path=str(output_file), games=len(chunk.fragments),
+                                  bytes=chunk.bytes + overhead))
+        else:
+            if not all(os.path.exists(path) for path in variant_paths(output_file)[:2]):
+                write_variants(output_file, chunk_minified(f"{name}_part_{chunk.part}", chunk.compacts))
+            stats['unchanged'] += 1
+        chunk.release()
+        written.append(chunk)
+
+    def offer(chunk):
+        # Hold one chunk back so an undersized neighbour can still be merged into it
+        nonlocal held
+        if held is not None:
+            if (small(held) or small(chunk)) and len(held.fragments) + len(chunk.fragments) <= games_per_file \
+                    and held.bytes + chunk.bytes <= budget:
+                held.absorb(chunk)
+                return
+            if held.fragments:
+                emit(held)
+        held = chunk
+
+    boundaries = iter(layout[1:])
+    boundary = next(boundaries, None)
+    current = Chunk(*layout[0])
+    for game in sorted_downloads(input_file):
+        key = title_key(game)
+        while boundary is not None and key >= boundary[1]:
+            offer(current)
+            current = Chunk(*boundary)
+            boundary = next(boundaries, None)
+        fragment = game_fragment(game)
+        size = len(fragment.encode('utf-8')) + 2 # ",\n" separator
+        # Split a chunk that outgrew its limits (never between two equal titles)
+        if current.fragments and key != current.last_key and \
+                (len(current.fragments) >= games_per_file or current.bytes + size > budget):
+            offer(current)
+            current = Chunk(next_part, key)
+            next_part += 1
+        current.add(key, game.get('title', ''), fragment, dumps_minified(game), size)
+    offer(current)
+    while boundary is not None:
+        offer(Chunk(*boundary))
+        boundary = next(boundaries, None)
+    if held is not None and held.fragments:
+        emit(held)
+
+    if not written:
+        log.warning(f"No downloads found in {input_file}", extra=fields(event='split_empty', path=str(input_file)))
+        return 0
+
+    # Remove part files of chunks that were merged away or emptied
+    kept = {chunk.part for chunk in written}
+    for part in sorted(existing_parts - kept):
+        remove_with_variants(output_dir / f"{stem}_part_{part}.json")
+        log.info(f"Removed {output_dir / f'{stem}_part_{part}.json'}",
+                 extra=fields(event='chunk_removed', path=str(output_dir / f'{stem}_part_{part}.json')))
+
+    written[0].start = '' # The first chunk also takes titles sorting before every current one
+    write_manifest(manifest_file, previous, name, Path(input_file).name, f"{base_url}/{output_dir.name}", stem,
+                   written, hashes)
+    log.info(f"{input_file}: {len(written)} chunks, {stats['written']} written, {stats['unchanged']} unchanged",
+             extra=fields(event='split', path=str(input_file), chunks=len(written), **stats))
+    return len(written)
+
+
+def write_manifest(manifest_file, previous, name, source, chunks_url, stem, chunks, hashes):
+    """Write manifest.json for a split; the version and its timestamp only change with the content."""
+    entries = []
+    for chunk in chunks:
+        sha256, size = hashes[chunk.part]
+        file_name = f"{stem}_part_{chunk.part}.json"
+        entries.append({
+            'part': chunk.part,
+            'file': file_name,
+            'url': f"{chunks_url}/{file_name}",
+            'games': chunk.games,
+            'bytes': size,
+            'start': chunk.start,
+            'firstTitle': chunk.first_title,
+            'lastTitle': chunk.last_title,
+            'sha256': sha256
+        })
+    version = hashlib.sha256(''.join(f"{entry['part']}:{entry['sha256']}\n" for entry in entries).encode('utf-8')).hexdigest()[:16]
+    if previous and previous.get('version') == version and previous.get('updated'):
+        updated = previous['updated']
+    else:
+        updated = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    manifest = {
+        'name': name,
+        'source': source,
+        'version': version,
+        'updated': updated,
+        'games': sum(entry['games'] for entry in entries),
+        'chunks': entries
+    }
+    write_bytes(manifest_file, json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'), only_if_changed=True)
+
+
+def _split_job(job):
+    return split_json_file(*job)
+
+
+def split_json_files(jobs):
+    """Run split_json_file for several (input_file, output_dir, games_per_file, max_bytes) jobs in parallel."""
+    if len(jobs) == 1:
+        return [_split_job(jobs[0])]
+    from concurrent.futures import ProcessPoolExecutor # Only needed here; keeps `split` quick to start
+    # Workers log the way this process does (and stay silent when it has no log output set up)
+    initializer, initargs = (configure_logging, logging_settings()) if logging_configured() else (None, ())
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1), initializer=initializer,
+                             initargs=initargs) as executor:
+        return list(executor.map(_split_job, jobs))
+
+
+def split_feeds(input_files, output_base_dir='split_files', games_per_file=GAMES_PER_FILE, max_bytes=MAX_CHUNK_BYTES,
+                base_url=SPLIT_FILES_URL):
+    """Split each feed into <output_base_dir>/<feed>/; returns the number of feeds split."""
+    jobs = []
     for input_file in input_files:
         if not os.path.exists(input_file):
-            print(f"Warning: {input_file} not found, skipping...")
+            log.warning(f"Warning: {input_file} not found, skipping...", extra=fields(event='split_missing', path=input_file))
             continue
-        
-        output_dir = os.path.join(output_base_dir, os.path.splitext(input_file)[0])
-        print(f"\nProcessing {input_file}...")
-        split_json_file(input_file, output_dir, games_per_file)
-    
-    print("\nSplitting complete!")
+
+        output_dir = os.path.join(output_base_dir, os.path.splitext(os.path.basename(input_file))[0])
+        log.info(f"Processing {input_file}...", extra=fields(event='split_start', path=input_file))
+        jobs.append((input_file, output_dir, games_per_file, max_bytes, base_url))
+    split_json_files(jobs)
+    return len(jobs)
+
+
+def add_arguments(parser):
+    parser.add_argument('input_files', nargs='*', default=['hydrasteam.json', 'hydrasteam_broad.json'],
+                        help='Feeds to split (default: hydrasteam.json hydrasteam_broad.json).')
+    parser.add_argument('--output-dir', default='split_files', help='Chunks go to <output-dir>/<feed>/.')
+    parser.add_argument('--games-per-file', type=int, default=GAMES_PER_FILE, help='Most games per chunk.')
+    parser.add_argument('--max-bytes', type=int, default=MAX_CHUNK_BYTES, help='Most bytes per chunk.')
+    parser.add_argument('--base-url', default=SPLIT_FILES_URL, help='Where split_files/ is published (for manifest URLs).')
+
+
+def run(args):
+    if not split_feeds(args.input_files, args.output_dir, args.games_per_file, args.max_bytes, args.base_url):
+        log.error("No input files found.", extra=fields(event='split_no_input'))
+        return 1
+    log.info("Splitting complete!", extra=fields(event='split_done'))
+    return 0
+
+
+def main(argv=None, prog=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog=prog, description="Split feeds into stable chunks with a manifest.")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging()
+    return run(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
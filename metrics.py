@@ -0,0 +1,186 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOG_FORMATS = ['text', 'json']
+
+log = logging.getLogger('hydrasteam')
+log.addHandler(logging.NullHandler()) # Silent until configure_logging, e.g. when used as a library
+_log_settings = ('INFO', 'text')
+
+
+class Histogram:
+    """Latency distribution in fixed LATENCY_BUCKETS, cheap to record and to merge across processes."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, data):
+        for i, count in enumerate(data['counts']):
+            self.counts[i] += count
+        self.count += data['count']
+        self.total += data['sum']
+        for bound, pick in (('min', min), ('max', max)):
+            if data[bound] is not None:
+                current = getattr(self, bound)
+                setattr(self, bound, data[bound] if current is None else pick(current, data[bound]))
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the maximum for the open-ended bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(LATENCY_BUCKETS[i], self.max) if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def raw(self):
+        return {'counts': list(self.counts), 'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max}
+
+    def summary(self):
+        summary = {'count': self.count, 'sum': round(self.total, 6),
+                   'mean': round(self.total / self.count, 6) if self.count else None,
+                   'min': self.min, 'max': self.max,
+                   'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99)}
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['inf']
+        summary['buckets'] = {bound: count for bound, count in zip(bounds, self.counts) if count}
+        return summary
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms of one process."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def drain(self):
+        """Return everything recorded so far as plain data and start over (for worker processes)."""
+        with self.lock:
+            data = {'counters': self.counters,
+                    'histograms': {name: histogram.raw() for name, histogram in self.histograms.items()}}
+            self.counters = {}
+            self.histograms = {}
+        return data
+
+    def merge(self, data):
+        """Add what another process recorded (see drain)."""
+        with self.lock:
+            for name, amount in data['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+            for name, raw in data['histograms'].items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.merge(raw)
+
+    def report(self):
+        with self.lock:
+            return {'counters': dict(sorted(self.counters.items())),
+                    'latency': {name: self.histograms[name].summary() for name in sorted(self.histograms)}}
+
+
+METRICS = Metrics()
+
+
+def write_run_report(path, **sections):
+    """Write the metrics and any extra sections (run info, totals) to a JSON report, atomically."""
+    report = dict(sections, **METRICS.report())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return report
+
+
+class TextFormatter(logging.Formatter):
+    """The bare message, as it used to be printed; on a terminal it first clears the progress line."""
+
+    def __init__(self, clear_line=False):
+        super().__init__()
+        self.clear_line = clear_line
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.exc_info:
+            message += '\n' + self.formatException(record.exc_info)
+        return f"\r{' ' * 100}\r{message}" if self.clear_line else message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, message and the record's structured fields."""
+
+    def format(self, record):
+        entry = {'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+                 'level': record.levelname, 'message': record.getMessage()}
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level='INFO', log_format='text'):
+    """Send the 'hydrasteam' logger to stdout at the given level, as text or JSON lines."""
+    global _log_settings
+    _log_settings = (level, log_format)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter(sys.stdout.isatty()))
+    log.handlers[:] = [handler]
+    log.setLevel(level)
+    log.propagate = False
+
+
+def logging_configured():
+    """Whether configure_logging has given the logger somewhere to write (the NullHandler drops everything)."""
+    return any(not isinstance(handler, logging.NullHandler) for handler in log.handlers)
+
+
+def logging_settings():
+    """(level, log_format) last passed to configure_logging, to set worker processes up the same way."""
+    return _log_settings
+
+
+def fields(**values):
+    """Structured fields for a log call: log.info(message, extra=fields(url=...))."""
+    return {'fields': values}
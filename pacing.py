@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Responses that mean "slow down" rather than "this page is broken"
+BACKOFF_STATUSES = (429, 503)
+MAX_BACKOFF_LEVEL = 10
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostPace:
+    """Pacing state of one host."""
+
+    def __init__(self):
+        self.next_start = 0.0
+        self.level = 0 # Backoff level; 0 is the base rate
+        self.window = deque() # (time, failed) for the recent responses
+        self.throttled = 0
+        self.errors = 0
+
+
+class PacingController:
+    """
+    Per-host request pacing driven by server feedback:
+    - requests to a host start at least base_interval seconds apart
+    - a 429/503, a 5xx or a connection error raises the host's backoff level,
+      spacing its requests backoff_unit * 2**(level - 1) seconds apart (capped
+      at max_delay) with +/- jitter, so parallel fetchers do not retry in lockstep
+    - Retry-After is honoured as a minimum wait
+    - each healthy response lowers the level by one, back to the base rate, as
+      long as the error rate over the last `window` seconds is at most error_rate
+    Only recent errors count, so a burst of failures hours ago no longer slows
+    every later request down.
+    """
+
+    def __init__(self, base_interval=0.5, backoff_unit=1.0, max_delay=120.0, window=60.0, error_rate=0.2,
+                 jitter=0.3, max_retry_after=600.0):
+        self.base_interval = base_interval
+        self.backoff_unit = backoff_unit
+        self.max_delay = max_delay
+        self.window = window
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlparse(url).netloc.lower()
+        pace = self.hosts.get(host)
+        if pace is None:
+            pace = self.hosts[host] = HostPace()
+        return pace
+
+    def _interval(self, pace):
+        if pace.level == 0:
+            return self.base_interval
+        delay = min(self.max_delay, max(self.base_interval, self.backoff_unit * 2 ** (pace.level - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _recent_error_rate(self, pace, now):
+        while pace.window and now - pace.window[0][0] > self.window:
+            pace.window.popleft()
+        if not pace.window:
+            return 0.0
+        return sum(1 for _, failed in pace.window if failed) / len(pace.window)
+
+    def wait(self, url):
+        """Block until the next request to url's host may start."""
+        with self.lock:
+            pace = self._host(url)
+            now = time.monotonic()
+            start = max(now, pace.next_start)
+            pace.next_start = start + self._interval(pace)
+        if start > now:
+            time.sleep(start - now)
+
+    def record(self, url, response=None, error=None):
+        """Feed back the outcome of a request: its response, or the exception it raised."""
+        status = response.status_code if response is not None else None
+        throttled = status in BACKOFF_STATUSES
+        failed = error is not None or throttled or (status is not None and status >= 500)
+        with self.lock:
+            pace = self._host(url)
+            now = time.monotonic()
+            pace.window.append((now, failed))
+            error_rate = self._recent_error_rate(pace, now)
+            if failed:
+                pace.level = min(pace.level + 1, MAX_BACKOFF_LEVEL)
+                pace.throttled += throttled
+                pace.errors += not throttled
+                # Push the host's next request out now, not only after the one already scheduled
+                wait = self._interval(pace)
+                retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+                if retry_after is not None:
+                    wait = max(wait, min(retry_after, self.max_retry_after))
+                pace.next_start = max(pace.next_start, now + wait)
+            elif pace.level and error_rate <= self.error_rate:
+                pace.level -= 1
+
+    def summary(self):
+        throttled = sum(pace.throttled for pace in self.hosts.values())
+        errors = sum(pace.errors for pace in self.hosts.values())
+        backed_off = [host for host, pace in self.hosts.items() if pace.level]
+        line = f"{throttled} throttled responses (429/503), {errors} other errors"
+        if backed_off:
+            line += f", still backing off: {', '.join(sorted(backed_off))}"
+        return line
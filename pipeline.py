@@ -0,0 +1,203 @@
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from metrics import METRICS, configure_logging, fields, log, logging_settings
+
+
+class StageStats:
+    """Items handled and seconds spent by one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.items += 1
+            self.busy += seconds
+        METRICS.observe(self.name, seconds)
+
+    def summary(self, wall):
+        rate = self.items / wall if wall > 0 else 0.0
+        return f"{self.name}: {self.items} pages, {self.busy:.1f}s busy, {rate:.1f} pages/s"
+
+
+def _init_worker(log_settings):
+    # Ctrl+C is handled by the main process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging(*log_settings)
+    METRICS.drain() # A forked worker starts with a copy of the parent's metrics, already counted there
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _timed_in_worker(func, *args):
+    """_timed, plus the metrics the call recorded in the worker process (merged by the main process)."""
+    result, seconds = _timed(func, *args)
+    return result, seconds, METRICS.drain()
+
+
+class _Page:
+    __slots__ = ('url', 'fetch_future', 'parse_future', 'response', 'result', 'error')
+
+    def __init__(self, url, fetch_future):
+        self.url = url
+        self.fetch_future = fetch_future
+        self.parse_future = None
+        self.response = None
+        self.result = None
+        self.error = None
+
+    def done(self):
+        return self.result is not None or self.error is not None or \
+            (self.parse_future is not None and self.parse_future.done())
+
+
+class PagePipeline:
+    """
+    Fetch -> parse -> merge pipeline for game pages.
+
+    - fetch: fetch_workers threads call fetch(url, session) on the shared
+      session; pacing requests is up to the fetch function
+    - parse: parse_workers processes run parse(content, url) on the raw bytes
+      (parse_workers=0 parses in the calling thread)
+    - merge: the caller, consuming run() results in list order
+
+    At most max_in_flight pages are between fetch and merge at any time, so a
+    slow stage holds the others back instead of letting pages pile up in memory.
+    """
+
+    def __init__(self, session, fetch, parse, fetch_workers=4, parse_workers=None, max_in_flight=None,
+                 scrape_state=None):
+        self.session = session
+        self.fetch = fetch
+        self.parse = parse
+        self.scrape_state = scrape_state
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='fetch')
+        if parse_workers is None:
+            parse_workers = os.cpu_count() or 1
+        self.parse_pool = ProcessPoolExecutor(max_workers=parse_workers, initializer=_init_worker,
+                                              initargs=(logging_settings(),)) \
+            if parse_workers > 0 else None
+        self.max_in_flight = max_in_flight or 2 * (fetch_workers + max(parse_workers, 1))
+        self.stats = [StageStats('fetch'), StageStats('parse'), StageStats('merge')]
+        self.waiting = 0.0 # Time the merge stage spent waiting for the next page in order
+        self.start_time = time.perf_counter()
+
+    def _fetch(self, url):
+        start = time.perf_counter()
+        response = self.fetch(url, self.session)
+        self.stats[0].add(time.perf_counter() - start)
+        return response
+
+    def _fetched(self, page):
+        """Hand a fetched page to the parse stage, unless its stored record is still valid."""
+        try:
+            page.response = page.fetch_future.result()
+        except Exception as e:
+            page.error = e
+            return
+        if page.response is None:
+            page.result = (None, False)
+            return
+        if self.scrape_state is not None:
+            record = self.scrape_state.unchanged_record(page.url, page.response.content)
+            if record is not None:
+                METRICS.incr('parse.skipped_unchanged')
+                page.result = (record, True)
+                return
+        if self.parse_pool is not None:
+            page.parse_future = self.parse_pool.submit(_timed_in_worker, self.parse, page.response.content, page.url)
+        else:
+            try:
+                game_data, seconds = _timed(self.parse, page.response.content, page.url)
+                self.stats[1].add(seconds)
+                page.result = (game_data, False)
+            except Exception as e:
+                page.error = e
+
+    def _finish(self, page):
+        """Collect the parse result of the page at the head of the queue."""
+        if page.parse_future is not None:
+            try:
+                game_data, seconds, worker_metrics = page.parse_future.result()
+                METRICS.merge(worker_metrics)
+                self.stats[1].add(seconds)
+                page.result = (game_data, False)
+            except Exception as e:
+                page.error = e
+        if page.result and page.result[0] and not page.result[1] and self.scrape_state is not None:
+            response = page.response
+            self.scrape_state.update(page.url, response.content, page.result[0], response.headers.get('Last-Modified'))
+
+    def run(self, urls):
+        """
+        Yield (url, game_data, page_unchanged, error) for each URL, in order.
+        error is the exception raised while fetching or parsing the page, or None.
+        """
+        urls = iter(urls)
+        window = deque()
+        fetching = {}
+
+        def fill():
+            while len(window) < self.max_in_flight:
+                url = next(urls, None)
+                if url is None:
+                    return
+                page = _Page(url, self.fetch_pool.submit(self._fetch, url))
+                window.append(page)
+                fetching[page.fetch_future] = page
+
+        fill()
+        while window:
+            head = window[0]
+            if not head.done():
+                waitables = set(fetching)
+                if head.parse_future is not None:
+                    waitables.add(head.parse_future)
+                start = time.perf_counter()
+                done, _ = wait(waitables, return_when=FIRST_COMPLETED)
+                self.waiting += time.perf_counter() - start
+                METRICS.observe('merge.wait', time.perf_counter() - start)
+                for future in done:
+                    page = fetching.pop(future, None)
+                    if page is not None:
+                        self._fetched(page)
+                continue
+
+            window.popleft()
+            self._finish(head)
+            fill()
+            game_data, page_unchanged = head.result if head.result else (None, False)
+            start = time.perf_counter()
+            yield head.url, game_data, page_unchanged, head.error
+            self.stats[2].add(time.perf_counter() - start)
+
+    def report(self):
+        wall = time.perf_counter() - self.start_time
+        log.info(f"⚙️ Pipeline ({wall:.1f}s): " + " | ".join(stage.summary(wall) for stage in self.stats)
+                 + f" | merge waited {self.waiting:.1f}s for pages",
+                 extra=fields(event='pipeline', seconds=round(wall, 3), merge_waited=round(self.waiting, 3),
+                              stages={stage.name: {'pages': stage.items, 'busy': round(stage.busy, 3)}
+                                      for stage in self.stats}))
+
+    def close(self):
+        self.fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
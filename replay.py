@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import io
+import os
+from urllib.parse import quote
+
+import requests
+
+# Longest URL-derived file name before falling back to a hash
+MAX_FILENAME_LENGTH = 200
+
+
+def url_to_filename(url):
+    """Map a URL to the file name it is stored under in a directory archive."""
+    name = quote(url, safe='')
+    if len(name) > MAX_FILENAME_LENGTH:
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return name + '.html'
+
+
+class DirectoryArchive:
+    """Pages saved one file per URL (see url_to_filename)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, url):
+        """Return the saved body for a URL, or None if it was never archived."""
+        try:
+            with open(os.path.join(self.path, url_to_filename(url)), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, url, content):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, url_to_filename(url)), 'wb') as f:
+            f.write(content)
+
+
+class WarcArchive:
+    """
+    Pages read from the response records of a WARC file (.warc or .warc.gz).
+    The whole file is indexed on load; the catalog-sized archives we replay fit in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            for headers, block in read_warc_records(f):
+                if headers.get('warc-type') == 'response' and headers.get('warc-target-uri'):
+                    status, body = parse_http_response(block)
+                    # Keep the first successful capture of each URL
+                    if status == 200:
+                        self.pages.setdefault(headers['warc-target-uri'], body)
+
+    def get(self, url):
+        return self.pages.get(url)
+
+
+def read_warc_records(f):
+    """Yield (lowercased WARC headers, content block) for each record in a WARC stream."""
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        if not line.strip():
+            continue # Blank lines separate records
+        if not line.startswith(b'WARC/'):
+            raise ValueError(f"Malformed WARC record header: {line[:50]!r}")
+        headers = {}
+        for line in iter(f.readline, b''):
+            if not line.strip():
+                break
+            name, _, value = line.decode('utf-8', 'replace').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        yield headers, f.read(int(headers.get('content-length', 0)))
+
+
+def parse_http_response(block):
+    """Split a raw HTTP response into (status code, decoded body)."""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.decode('iso-8859-1').split('\r\n')
+    try:
+        status = int(lines[0].split()[1])
+    except (IndexError, ValueError):
+        return None, body
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        body = decode_chunked(body)
+    if headers.get('content-encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return status, body
+
+
+def decode_chunked(body):
+    stream = io.BytesIO(body)
+    decoded = bytearray()
+    while True:
+        size_line = stream.readline()
+        if not size_line:
+            break
+        size = int(size_line.split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        decoded += stream.read(size)
+        stream.readline() # CRLF after each chunk
+    return bytes(decoded)
+
+
+def open_archive(path):
+    """Open a replay archive: a directory keyed by URL or a WARC file."""
+    if os.path.isdir(path):
+        return DirectoryArchive(path)
+    if path.endswith(('.warc', '.warc.gz')):
+        return WarcArchive(path)
+    raise ValueError(f"Replay archive must be a directory or a .warc/.warc.gz file: {path}")
+
+
+class ReplayResponse:
+    """The parts of requests.Response the scraper uses."""
+
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content if content is not None else b''
+        self.status_code = 200 if content is not None else 404
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Not in replay archive: {self.url}", response=self)
+
+
+class ReplaySession:
+    """Stand-in for requests.Session that serves every page from an archive, with no network access."""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.headers = {}
+
+    def get(self, url, **kwargs):
+        return ReplayResponse(url, self.archive.get(url))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordingSession(requests.Session):
+    """requests.Session that saves every successful GET into a directory archive for later replay."""
+
+    def __init__(self, archive_dir):
+        super().__init__()
+        self.archive = DirectoryArchive(archive_dir)
+
+    def get(self, url, **kwargs):
+        response = super().get(url, **kwargs)
+        if response.status_code == 200:
+            self.archive.save(url, response.content)
+        return response
@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+from metrics import fields, log
+
+# Failed attempts after which a page is left out of resumed runs
+MAX_ATTEMPTS = 3
+
+
+class RunState:
+    """
+    Progress of one scrape run, saved so an interrupted run can be resumed:
+    - game_links: the run's queue of game pages, in list order
+    - completed: pages that are done (parsed, or unparseable)
+    - attempts: failed fetch/parse attempts per page
+    - success_count / error_count: the progress line counters
+    - elapsed: seconds spent processing so far, the baseline for the ETA
+    """
+
+    def __init__(self, path, game_links=()):
+        self.path = path
+        self.game_links = list(game_links)
+        self.completed = set()
+        self.attempts = {}
+        self.success_count = 0
+        self.error_count = 0
+        self.elapsed = 0.0
+        self.session_start = time.time()
+
+    @classmethod
+    def load(cls, path):
+        """Return the saved state of an interrupted run, or None if there is none."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            state = cls(path, data['game_links'])
+            state.completed = set(data.get('completed', []))
+            state.attempts = data.get('attempts', {})
+            state.success_count = data.get('success_count', 0)
+            state.error_count = data.get('error_count', 0)
+            state.elapsed = data.get('elapsed', 0.0)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            log.warning(f"Warning: Could not read run state from {path}: {e}. Starting a fresh run.",
+                        extra=fields(event='run_state_error', path=path, error=str(e)))
+            return None
+        return state
+
+    def pending(self):
+        """Pages still to process, in queue order."""
+        return [url for url in self.game_links
+                if url not in self.completed and self.attempts.get(url, 0) < MAX_ATTEMPTS]
+
+    def complete(self, url):
+        self.completed.add(url)
+
+    def fail(self, url):
+        """Count a failed attempt; the page stays pending so a resumed run retries it."""
+        self.attempts[url] = self.attempts.get(url, 0) + 1
+        self.error_count += 1
+
+    def total_elapsed(self):
+        return self.elapsed + time.time() - self.session_start
+
+    def save(self):
+        data = {
+            'game_links': self.game_links,
+            'completed': [url for url in self.game_links if url in self.completed],
+            'attempts': self.attempts,
+            'success_count': self.success_count,
+            'error_count': self.error_count,
+            'elapsed': self.total_elapsed(),
+            'saved_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import time
+
+from metrics import fields, log
+
+
+def content_hash(content):
+    """Fingerprint of a page body."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class ScrapeState:
+    """
+    Per-URL state kept between incremental runs:
+    - content_hash: fingerprint of the last fetched body
+    - last_modified: the server's Last-Modified header for it, if any
+    - last_seen: when the URL was last on the game list
+    - record: the game record extracted from that body
+    - missing_since: set while the URL is no longer on the game list
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.pages = json.load(f).get('pages', {})
+                log.info(f"Loaded scrape state for {len(self.pages)} pages from {path}",
+                         extra=fields(event='scrape_state_loaded', path=path, pages=len(self.pages)))
+            except (json.JSONDecodeError, AttributeError) as e:
+                log.warning(f"Warning: Could not read scrape state from {path}: {e}. Starting fresh.",
+                            extra=fields(event='scrape_state_error', path=path, error=str(e)))
+
+    def unchanged_record(self, url, content):
+        """Return the stored record if the page body is unchanged since it was extracted, else None."""
+        page = self.pages.get(url)
+        if page and page.get('record') and page.get('content_hash') == content_hash(content):
+            return page['record']
+        return None
+
+    def update(self, url, content, record, last_modified=None):
+        page = self.pages.setdefault(url, {})
+        page['content_hash'] = content_hash(content)
+        page['last_modified'] = last_modified
+        page['record'] = record
+
+    def mark_listed(self, game_links):
+        """
+        Record which URLs are on the game list now.
+        Returns the URLs that dropped off the list since the last run.
+        """
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        listed = set(game_links)
+        for url in game_links:
+            page = self.pages.setdefault(url, {})
+            page['last_seen'] = now
+            page.pop('missing_since', None)
+
+        newly_missing = []
+        for url, page in self.pages.items():
+            if url not in listed and 'missing_since' not in page:
+                page['missing_since'] = now
+                newly_missing.append(url)
+        return newly_missing
+
+    def missing(self):
+        return [url for url, page in self.pages.items() if 'missing_since' in page]
+
+    def known_urls(self):
+        """URLs whose game has been extracted before."""
+        return {url for url, page in self.pages.items() if page.get('record')}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': self.pages}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,455 @@
+import argparse
+import bisect
+import contextlib
+import heapq
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from catalog import GameRecord, as_record, split_title_version
+from compact import dumps_minified, orjson
+from feeds import feed_paths, load_published_catalog
+
+INDEX_FILE = 'search_index.json'
+INDEX_FORMAT = 1
+SEARCH_LIMIT = 20
+MODES = ['auto', 'prefix', 'words', 'fuzzy']
+# Catalog changes adding more games than this share of the index re-sort it once instead of inserting one by one
+BULK_SHARE = 0.05
+# Removed slots are only dropped by a full rebuild, once they are this share of the index
+MAX_REMOVED_SHARE = 0.25
+# Vocabulary words sharing the most trigrams with a mistyped word that get an edit-distance check
+FUZZY_CANDIDATES = 50
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Lowercased, accent-free words of a text, single-spaced: "Café Racer: Deluxe" -> "cafe racer deluxe"."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def title_key(title):
+    """What a title is searched by: its base title (no version suffix), normalized."""
+    return normalize(split_title_version(title)[0])
+
+
+def trigrams(word):
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(word):
+    """Edits tolerated in a query word: none in very short words or numbers (2076 is not 2077), two in long ones."""
+    if len(word) <= 2 or any(char.isdigit() for char in word):
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(a, b, limit):
+    """Edit distance counting a swap of neighbouring letters as one edit; limit + 1 once it is over limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # A shared start or end never changes the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    over = limit + 1
+    # Only cells within `limit` of the diagonal can stay within limit
+    before_previous = None
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        row_best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            char_b = b[j - 1]
+            cost = previous[j - 1] + (char_a != char_b)
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b and before_previous[j - 2] + 1 < cost:
+                cost = before_previous[j - 2] + 1
+            current[j] = cost
+            if cost < row_best:
+                row_best = cost
+        if row_best > limit:
+            return over
+        before_previous, previous = previous, current
+    return min(previous[-1], over)
+
+
+def source_keys(paths):
+    """(size, mtime) of each feed file, to tell whether the index is still current."""
+    keys = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        keys[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+    return keys
+
+
+class SearchIndex:
+    """
+    Title search over the catalog, persisted to <output_dir>/search_index.json:
+    - prefix: the normalized titles in a sorted array, searched with bisect
+    - words: an inverted index from each word to the games containing it (the last
+      query word matches as a prefix, for search-as-you-type)
+    - fuzzy: words sharing enough trigrams with a mistyped one are candidates,
+      kept if they are within max_typos edits of it
+    Each game has a slot; when the catalog changes only the games added, renamed or
+    removed are (un)indexed, and a game whose size, date or links changed is just replaced.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.sources = {}
+        self.games = [] # GameRecord per slot, None once removed
+        self.keys = [] # title_key per slot
+        self.slots = {} # lowercased title -> slot
+        self.postings = {} # word -> slots of the games containing it
+        self.grams = {} # trigram -> words containing it
+        self.sorted_keys = []
+        self.sorted_slots = []
+        self.vocabulary = [] # every word, sorted
+        self.removed = 0
+        self.last_changes = None # What the last refresh changed
+
+    def __len__(self):
+        return len(self.games) - self.removed
+
+    def __iter__(self):
+        return (game for game in self.games if game is not None)
+
+    # Building
+
+    def _add(self, game, in_order=True):
+        slot = len(self.games)
+        key = title_key(game.title)
+        self.games.append(game)
+        self.keys.append(key)
+        self.slots[game.title.strip().lower()] = slot
+        for word in set(key.split()):
+            slots = self.postings.get(word)
+            if slots is None:
+                slots = self.postings[word] = set()
+                for gram in trigrams(word):
+                    self.grams.setdefault(gram, set()).add(word)
+                if in_order:
+                    bisect.insort(self.vocabulary, word)
+            slots.add(slot)
+        if in_order:
+            position = bisect.bisect_right(self.sorted_keys, key)
+            self.sorted_keys.insert(position, key)
+            self.sorted_slots.insert(position, slot)
+
+    def _remove(self, slot):
+        key = self.keys[slot]
+        for word in set(key.split()):
+            slots = self.postings[word]
+            slots.discard(slot)
+            if not slots:
+                del self.postings[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+        position = bisect.bisect_left(self.sorted_keys, key)
+        while self.sorted_slots[position] != slot:
+            position += 1
+        del self.sorted_keys[position]
+        del self.sorted_slots[position]
+        del self.slots[self.games[slot].title.strip().lower()]
+        self.games[slot] = None
+        self.removed += 1
+
+    def _sort(self):
+        self.sorted_slots = sorted((slot for slot, game in enumerate(self.games) if game is not None),
+                                   key=self.keys.__getitem__)
+        self.sorted_keys = [self.keys[slot] for slot in self.sorted_slots]
+        self.vocabulary = sorted(self.postings)
+
+    def rebuild(self, games):
+        """Index these games from scratch."""
+        self.games, self.keys, self.slots, self.postings, self.grams = [], [], {}, {}, {}
+        self.removed = 0
+        for game in games:
+            if game.title.strip().lower() not in self.slots:
+                self._add(game, in_order=False)
+        self._sort()
+
+    def update(self, games):
+        """
+        Bring the index in line with the catalog (GameRecords or dicts).
+        Returns {'added': n, 'updated': n, 'removed': n}.
+        """
+        catalog = {}
+        for game in games:
+            game = as_record(game)
+            catalog.setdefault(game.title.strip().lower(), game)
+        gone = [slot for title, slot in self.slots.items() if title not in catalog]
+        new = [game for title, game in catalog.items() if title not in self.slots]
+        changes = {'added': len(new), 'updated': 0, 'removed': len(gone)}
+
+        if self.removed + len(gone) > MAX_REMOVED_SHARE * (len(self.games) + len(new)):
+            changes['updated'] = sum(1 for title, slot in self.slots.items()
+                                     if title in catalog and catalog[title] != self.games[slot])
+            self.rebuild(catalog.values())
+            return changes
+
+        for slot in gone:
+            self._remove(slot)
+        for title, slot in self.slots.items():
+            if catalog[title] != self.games[slot]:
+                # Same title, so the same key: only the record changes
+                self.games[slot] = catalog[title]
+                changes['updated'] += 1
+        in_order = len(new) <= BULK_SHARE * len(self)
+        for game in new:
+            self._add(game, in_order)
+        if not in_order:
+            self._sort()
+        return changes
+
+    def refresh(self, output_dir):
+        """
+        Update and save the index if the published feeds changed since it was built.
+        Returns the changes (see update), or None if it was current.
+        """
+        paths = feed_paths(output_dir)
+        sources = source_keys(paths)
+        if sources == self.sources:
+            return None
+        # The feed loader reports what it read on stdout, which is kept for the search results
+        with contextlib.redirect_stdout(sys.stderr):
+            games = load_published_catalog(*paths)
+        changes = self.update(games)
+        self.sources = sources
+        if self.path:
+            self.save()
+        return changes
+
+    # Persistence
+
+    def save(self, path=None):
+        path = path or self.path
+        data = {'format': INDEX_FORMAT, 'sources': self.sources,
+                'games': [[game.title, game.file_size, game.upload_date, list(game.uris)] if game is not None else None
+                          for game in self.games],
+                'keys': self.keys,
+                'postings': {word: sorted(slots) for word, slots in self.postings.items()},
+                'grams': {gram: sorted(words) for gram, words in self.grams.items()},
+                'prefix': self.sorted_slots}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps_minified(data))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index; ValueError if it is unreadable or in another format."""
+        with open(path, 'rb') as f:
+            data = orjson.loads(f.read()) if orjson is not None else json.load(f)
+        if not isinstance(data, dict) or data.get('format') != INDEX_FORMAT:
+            raise ValueError(f"{path} is not a search index in format {INDEX_FORMAT}")
+        index = cls(path)
+        index.sources = data['sources']
+        index.games = [GameRecord(*game) if game is not None else None for game in data['games']]
+        index.keys = data['keys']
+        index.slots = {game.title.strip().lower(): slot for slot, game in enumerate(index.games) if game is not None}
+        index.removed = len(index.games) - len(index.slots)
+        index.postings = {word: set(slots) for word, slots in data['postings'].items()}
+        index.grams = {gram: set(words) for gram, words in data['grams'].items()}
+        index.sorted_slots = data['prefix']
+        index.sorted_keys = [index.keys[slot] for slot in index.sorted_slots]
+        index.vocabulary = sorted(index.postings)
+        return index
+
+    # Lookups
+
+    def _ranked(self, slots, limit, distance=None):
+        """The best `limit` games: fewest typos, then the shortest (closest) title."""
+        if distance is None:
+            best = heapq.nsmallest(limit, slots, key=lambda slot: (len(self.keys[slot]), self.keys[slot]))
+        else:
+            best = heapq.nsmallest(limit, slots, key=lambda slot: (distance[slot], len(self.keys[slot]), self.keys[slot]))
+        return [self.games[slot] for slot in best]
+
+    def prefix(self, text, limit=SEARCH_LIMIT):
+        """Games whose normalized title starts with the normalized text, in title order."""
+        key = normalize(text)
+        start = bisect.bisect_left(self.sorted_keys, key)
+        end = bisect.bisect_left(self.sorted_keys, key + '\U0010ffff', start)
+        return [self.games[slot] for slot in self.sorted_slots[start:min(end, start + limit)]]
+
+    def completions(self, word):
+        """Vocabulary words starting with word."""
+        start = bisect.bisect_left(self.vocabulary, word)
+        end = bisect.bisect_left(self.vocabulary, word + '\U0010ffff', start)
+        return self.vocabulary[start:end]
+
+    def _word_matches(self, words):
+        """Slots of the games containing every word (the last one may be the start of a word)."""
+        sets = [self.postings.get(word, set()) for word in words[:-1]]
+        last = self.completions(words[-1])
+        sets.append(self.postings[last[0]] if len(last) == 1 else set().union(*(self.postings[word] for word in last)))
+        sets.sort(key=len)
+        return set.intersection(*sets) if sets[0] else set()
+
+    def words(self, text, limit=SEARCH_LIMIT):
+        """Games containing all the words of the text, in any order."""
+        words = normalize(text).split()
+        return self._ranked(self._word_matches(words), limit) if words else []
+
+    def similar_words(self, word):
+        """{vocabulary word: edits} for the words within max_typos(word) edits of word."""
+        if word in self.postings:
+            return {word: 0}
+        limit = max_typos(word)
+        if not limit:
+            return {}
+        grams = trigrams(word)
+        shared = {}
+        for gram in grams:
+            for candidate in self.grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        # Each edit changes at most 4 of a word's trigrams (a swap of two letters), so a word
+        # within `limit` edits shares all but 4 * limit of them; of those, the ones sharing
+        # the most are checked
+        needed = max(1, len(grams) - 4 * limit)
+        candidates = [(count, candidate) for candidate, count in shared.items()
+                      if count >= needed and abs(len(candidate) - len(word)) <= limit]
+        similar = {}
+        for _, candidate in heapq.nlargest(FUZZY_CANDIDATES, candidates):
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit:
+                similar[candidate] = distance
+        return similar
+
+    def fuzzy(self, text, limit=SEARCH_LIMIT):
+        """Games containing a word within a few typos of every word of the text, fewest typos first."""
+        words = normalize(text).split()
+        if not words:
+            return []
+        # Per query word, the games of each similar word, closest first
+        matches = []
+        for word in words:
+            similar = self.similar_words(word)
+            if not similar:
+                return []
+            matches.append(sorted(((edits, self.postings[candidate]) for candidate, edits in similar.items()),
+                                  key=lambda match: match[0]))
+        # Start from the word matching the fewest games and only narrow that set down
+        matches.sort(key=lambda word_matches: sum(len(slots) for _, slots in word_matches))
+        distance = {}
+        for edits, slots in matches[0]:
+            for slot in slots:
+                distance.setdefault(slot, edits)
+        for word_matches in matches[1:]:
+            narrowed = {}
+            for slot, total in distance.items():
+                for edits, slots in word_matches:
+                    if slot in slots:
+                        narrowed[slot] = total + edits
+                        break
+            distance = narrowed
+            if not distance:
+                return []
+        return self._ranked(distance, limit, distance)
+
+    def search(self, text, limit=SEARCH_LIMIT, mode='auto'):
+        """
+        Look a title up. 'auto' lists title-prefix matches first, then games containing
+        all the words, then typo-tolerant matches, until limit games are found.
+        """
+        if mode != 'auto':
+            return getattr(self, mode)(text, limit)
+        results = []
+        seen = set()
+        for lookup in (self.prefix, self.words, self.fuzzy):
+            for game in lookup(text, limit):
+                if id(game) not in seen:
+                    seen.add(id(game))
+                    results.append(game)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+
+def open_index(output_dir='.', rebuild=False):
+    """
+    The search index of an output directory's published feeds: loaded from
+    search_index.json, updated incrementally (and saved) if the feeds changed,
+    or built from scratch if there is none or rebuild is set.
+    """
+    path = os.path.join(output_dir, INDEX_FILE)
+    index = None
+    if not rebuild:
+        try:
+            index = SearchIndex.load(path)
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"Warning: Could not read {path}: {e}. Rebuilding it.", file=sys.stderr)
+    if index is None:
+        index = SearchIndex(path)
+    index.last_changes = index.refresh(output_dir)
+    return index
+
+
+def search(query, output_dir='.', limit=SEARCH_LIMIT, mode='auto'):
+    """One-off lookup: the matching games as dicts in the hydrasteam.json schema."""
+    return [game.to_dict() for game in open_index(output_dir).search(query, limit, mode)]
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Search the published catalog by title.")
+    parser.add_argument('query', nargs='+', help='Title, start of a title or words of it (typos are tolerated).')
+    parser.add_argument('--output-dir', default='.', help='Directory holding the feeds (and search_index.json).')
+    parser.add_argument('--limit', type=int, default=SEARCH_LIMIT, help='Maximum number of results.')
+    parser.add_argument('--mode', default='auto', choices=MODES,
+                        help='prefix, words, fuzzy or (default) all three in that order.')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from scratch.')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = open_index(args.output_dir, args.rebuild)
+    loaded = time.perf_counter() - start
+    if index.last_changes:
+        changes = index.last_changes
+        print(f"🗂️ Search index updated: {changes['added']} added, {changes['updated']} updated, "
+              f"{changes['removed']} removed ({len(index)} games)", file=sys.stderr)
+    if not len(index):
+        print(f"❌ No published games found in {args.output_dir}.", file=sys.stderr)
+        return 1
+
+    query = ' '.join(args.query)
+    start = time.perf_counter()
+    results = index.search(query, args.limit, args.mode)
+    lookup = time.perf_counter() - start
+    if args.json:
+        print(json.dumps([game.to_dict() for game in results], ensure_ascii=False, indent=2))
+        return 0
+    print(f"🔎 {len(results)} matches for \"{query}\" (index ready in {loaded * 1000:.1f} ms, lookup {lookup * 1e6:.0f} µs)")
+    for game in results:
+        print(f"   {game.title} | {game.file_size} | {game.upload_date} | {len(game.uris)} links")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+import argparse
+import asyncio
+import email.utils
+import hashlib
+import json
+import mmap
+import os
+import signal
+import time
+
+from compact import variant_base
+from feeds import build_feeds, feed_paths, parse_feed_spec
+from metrics import LOG_FORMATS, METRICS, configure_logging, fields, log
+from publish import published_paths
+
+HOST = '127.0.0.1'
+PORT = 8080
+# Clients may reuse a response this long before revalidating it (a 304 when it is unchanged)
+MAX_AGE = 60
+# How often the output directory is checked for a newly published catalog
+RELOAD_INTERVAL = 2.0
+KEEPALIVE_TIMEOUT = 30
+MAX_HEADER_BYTES = 16 * 1024
+LISTEN_BACKLOG = 4096
+WRITE_BLOCK = 256 * 1024
+CONTENT_TYPES = {'.json': 'application/json; charset=utf-8', '.gz': 'application/gzip', '.br': 'application/x-brotli'}
+# Pre-compressed siblings of X.json / X.min.json, in order of preference
+ENCODINGS = (('br', '.min.json.br'), ('gzip', '.min.json.gz'))
+REASONS = {200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 416: 'Range Not Satisfiable', 431: 'Request Header Fields Too Large'}
+
+
+class Body:
+    """The bytes of one representation, with its strong ETag and Last-Modified date."""
+
+    def __init__(self, data, mtime, key=None):
+        self.data = data
+        self.size = len(data)
+        self.key = key # (inode, size, mtime) of the file it was mapped from
+        self.etag = '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Map a published file into memory. Files are published by renaming a new
+        file over the old one, so a mapping stays valid (and in use by the requests
+        holding it) after the next version replaces it.
+        """
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        return cls(data, stat.st_mtime, (stat.st_ino, stat.st_size, stat.st_mtime_ns))
+
+
+class Resource:
+    """A served URL: its file as-is plus the pre-compressed variants a client may get instead."""
+
+    def __init__(self, body, content_type, encoded=()):
+        self.body = body
+        self.content_type = content_type
+        self.encoded = list(encoded) # (content coding, Body), preferred first
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def published_files(feeds, output_dir):
+    """URL path -> file path of everything published: the feeds and their variants, split_files/ and deltas/."""
+    files = {}
+    for path in published_paths(feeds, output_dir):
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                for name in names:
+                    if not name.endswith('.tmp'):
+                        files[os.path.join(directory, name)] = None
+        else:
+            files[path] = None
+    return {'/' + os.path.relpath(path, output_dir).replace(os.sep, '/'): path for path in sorted(files)}
+
+
+class Snapshot:
+    """One published version of the catalog: every served file, mapped and hashed."""
+
+    def __init__(self, files, previous=None):
+        old_bodies = previous.bodies if previous else {}
+        self.bodies = {}
+        for url_path, path in files.items():
+            body = old_bodies.get(url_path)
+            try:
+                if body is None or body.key != file_key(path):
+                    body = Body.from_file(path)
+            except OSError:
+                continue # Removed since the scan
+            self.bodies[url_path] = body
+
+        self.resources = {}
+        for url_path, body in self.bodies.items():
+            extension = os.path.splitext(url_path)[1]
+            encoded = []
+            if url_path.endswith('.json'):
+                base = url_path[:-len('.min.json')] if url_path.endswith('.min.json') else variant_base(url_path)
+                encoded = [(coding, self.bodies[base + suffix]) for coding, suffix in ENCODINGS
+                           if base + suffix in self.bodies]
+            self.resources[url_path] = Resource(body, CONTENT_TYPES.get(extension, 'application/octet-stream'), encoded)
+
+        index = {'files': {url_path: {'bytes': body.size, 'etag': body.etag.strip('"')}
+                           for url_path, body in self.bodies.items()}}
+        self.resources['/'] = Resource(Body(json.dumps(index, indent=2).encode('utf-8'), time.time()),
+                                       CONTENT_TYPES['.json'])
+        self.version = hashlib.blake2b(json.dumps(index, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def accepted_codings(header):
+    """
+    (allowed, refused) content codings of an Accept-Encoding header: q=0 refuses a
+    coding, and a '*' among the allowed ones stands for any coding not refused.
+    """
+    codings = set()
+    refused = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            (codings if q > 0 else refused).add(coding.strip().lower())
+    return codings, refused
+
+
+def etag_matches(header, etag):
+    """If-None-Match: '*' or any listed tag (weak comparison, as RFC 9110 requires for it)."""
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def parse_range(header, size):
+    """
+    (start, end) for a single 'bytes=' range, end exclusive. Returns None to serve
+    the whole file (no range, several ranges or another unit) and False if unsatisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(0, size - length), size
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        return None
+    if start >= size or end <= start:
+        return False
+    return start, end
+
+
+class CatalogServer:
+    """
+    Serves the published feeds, their minified/compressed variants, split_files/
+    and deltas/ over HTTP/1.1 from one asyncio event loop:
+    - strong ETags, If-None-Match (304) and single byte ranges (206, with If-Range)
+    - the pre-compressed .min.json.br / .min.json.gz siblings for clients accepting them
+    - files are memory-mapped; a new catalog version is mapped next to the current one
+      and swapped in at once, after its files have stopped changing for a reload interval
+    GET / lists the served files with their sizes and ETags.
+    """
+
+    def __init__(self, output_dir, feeds, max_age=MAX_AGE, reload_interval=RELOAD_INTERVAL):
+        self.output_dir = output_dir
+        self.feeds = feeds
+        self.cache_control = f"public, max-age={max_age}"
+        self.reload_interval = reload_interval
+        self.snapshot = Snapshot(published_files(feeds, output_dir))
+        self._pending = None
+        self._date = (0, '')
+        self.connections = 0
+
+    def scan(self):
+        files = published_files(self.feeds, self.output_dir)
+        keys = {}
+        for url_path, path in files.items():
+            try:
+                keys[url_path] = file_key(path)
+            except OSError:
+                pass
+        return files, keys
+
+    def check_reload(self, force=False):
+        """
+        Swap in a new snapshot if the published files changed. Unless forced, the
+        change must be the same on two scans in a row, so a publish still writing
+        its feeds and variants is never served half-way.
+        """
+        files, keys = self.scan()
+        current = {url_path: body.key for url_path, body in self.snapshot.bodies.items()}
+        if keys == current:
+            self._pending = None
+            return False
+        if not force and keys != self._pending:
+            self._pending = keys
+            return False
+        self._pending = None
+        previous = self.snapshot
+        self.snapshot = Snapshot(files, previous)
+        METRICS.incr('serve.reloads')
+        log.info(f"🔄 Catalog reloaded: version {self.snapshot.version}, {len(self.snapshot.bodies)} files",
+                 extra=fields(event='reload', version=self.snapshot.version, files=len(self.snapshot.bodies)))
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                self.check_reload()
+            except Exception as e:
+                log.error(f"❌ Reload failed: {e}", extra=fields(event='reload_error'))
+
+    def http_date(self):
+        now = int(time.time())
+        if self._date[0] != now:
+            self._date = (now, email.utils.formatdate(now, usegmt=True))
+        return self._date[1]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        METRICS.incr('serve.connections')
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self.respond_error(writer, 431)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                request = self.parse_request(head)
+                if request is None:
+                    await self.respond_error(writer, 400)
+                    break
+                method, path, version, headers = request
+                if 'transfer-encoding' in headers:
+                    await self.respond_error(writer, 400)
+                    break
+                if headers.get('content-length', '0') != '0':
+                    try:
+                        await reader.readexactly(int(headers['content-length']))
+                    except (ValueError, asyncio.IncompleteReadError):
+                        break
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                await self.respond(writer, method, path, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    @staticmethod
+    def parse_request(head):
+        try:
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            return None
+        if not version.startswith('HTTP/1.'):
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        path = target.split('?', 1)[0].split('#', 1)[0]
+        return method, path, version, headers
+
+    def write_head(self, writer, status, headers, keep_alive):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Date: {self.http_date()}", "Server: hydrasteam"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        METRICS.incr(f"serve.status.{status}")
+
+    async def respond_error(self, writer, status, keep_alive=False, extra_headers=()):
+        body = json.dumps({'error': REASONS[status]}).encode('utf-8')
+        self.write_head(writer, status, [('Content-Type', CONTENT_TYPES['.json']),
+                                         ('Content-Length', len(body))] + list(extra_headers), keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    async def respond(self, writer, method, path, headers, keep_alive):
+        if method not in ('GET', 'HEAD'):
+            await self.respond_error(writer, 405, keep_alive, [('Allow', 'GET, HEAD')])
+            return
+        resource = self.snapshot.resources.get(path)
+        if resource is None:
+            await self.respond_error(writer, 404, keep_alive)
+            return
+
+        body, coding = resource.body, None
+        if resource.encoded:
+            accepted, refused = accepted_codings(headers.get('accept-encoding', ''))
+            for candidate, encoded_body in resource.encoded:
+                if candidate in accepted or ('*' in accepted and candidate not in refused):
+                    body, coding = encoded_body, candidate
+                    break
+        response_headers = [('Content-Type', resource.content_type), ('ETag', body.etag),
+                            ('Last-Modified', body.last_modified), ('Cache-Control', self.cache_control),
+                            ('Accept-Ranges', 'bytes')]
+        if resource.encoded:
+            response_headers.append(('Vary', 'Accept-Encoding'))
+        if coding:
+            response_headers.append(('Content-Encoding', coding))
+
+        if 'if-none-match' in headers and etag_matches(headers['if-none-match'], body.etag):
+            self.write_head(writer, 304, response_headers, keep_alive)
+            await writer.drain()
+            return
+
+        status, start, end = 200, 0, body.size
+        if 'range' in headers and headers.get('if-range', body.etag) == body.etag:
+            byte_range = parse_range(headers['range'], body.size)
+            if byte_range is False:
+                await self.respond_error(writer, 416, keep_alive, [('Content-Range', f"bytes */{body.size}")])
+                return
+            if byte_range:
+                status, (start, end) = 206, byte_range
+                response_headers.append(('Content-Range', f"bytes {start}-{end - 1}/{body.size}"))
+        response_headers.append(('Content-Length', end - start))
+        self.write_head(writer, status, response_headers, keep_alive)
+        if method == 'GET':
+            view = memoryview(body.data)
+            for offset in range(start, end, WRITE_BLOCK):
+                writer.write(view[offset:min(offset + WRITE_BLOCK, end)])
+                await writer.drain()
+            METRICS.incr('serve.bytes', end - start)
+        await writer.drain()
+        log.debug(f"{method} {path} {status}", extra=fields(event='request', path=path, status=status, coding=coding))
+
+
+def raise_open_file_limit():
+    """Allow as many open connections as the hard limit permits."""
+    try:
+        import resource
+    except ImportError: # Not on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = max(soft, 65536) if hard == resource.RLIM_INFINITY else hard
+    if target > soft:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+
+async def serve(server, host=HOST, port=PORT):
+    """Run the server until SIGINT/SIGTERM."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, AttributeError):
+            pass
+    if hasattr(signal, 'SIGHUP'):
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: server.check_reload(force=True))
+        except NotImplementedError:
+            pass
+
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER_BYTES, backlog=LISTEN_BACKLOG)
+    watcher = asyncio.create_task(server.watch())
+    addresses = ', '.join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in listener.sockets)
+    print(f"🌐 Serving {len(server.snapshot.bodies)} files from {os.path.abspath(server.output_dir)} on {addresses} "
+          f"(version {server.snapshot.version})", flush=True)
+    try:
+        await stop.wait()
+    finally:
+        watcher.cancel()
+        listener.close()
+        await listener.wait_closed()
+    counters = METRICS.report()['counters']
+    print(f"👋 Server stopped after {counters.get('serve.connections', 0)} connections, "
+          f"{sum(v for k, v in counters.items() if k.startswith('serve.status.'))} responses.")
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Serve the published feeds, chunks and deltas over HTTP.")
+    parser.add_argument('--output-dir', default='.', help='Directory holding the feeds.')
+    parser.add_argument('--host', default=HOST, help=f'Address to listen on (default: {HOST}).')
+    parser.add_argument('--port', type=int, default=PORT, help=f'Port to listen on (default: {PORT}).')
+    parser.add_argument('--feed', action='append', default=[], metavar='FILE=HOST[,HOST...]',
+                        help='Also serve this extra feed (repeatable).')
+    parser.add_argument('--max-age', type=int, default=MAX_AGE, help='Cache-Control max-age in seconds.')
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help='Seconds between checks for a newly published catalog.')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='DEBUG logs every request.')
+    parser.add_argument('--log-format', default='text', choices=LOG_FORMATS, help='Log as text or JSON lines.')
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level, args.log_format)
+    try:
+        extra_feeds = [parse_feed_spec(spec) for spec in args.feed]
+    except ValueError as e:
+        parser.error(str(e))
+    main_path, broad_path = feed_paths(args.output_dir)
+    server = CatalogServer(args.output_dir, build_feeds(main_path, broad_path, extra_feeds or None),
+                           args.max_age, args.reload_interval)
+    if not server.snapshot.bodies:
+        print(f"❌ Nothing published in {args.output_dir} to serve.")
+        return 1
+    raise_open_file_limit()
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except OSError as e:
+        print(f"❌ Could not listen on {args.host}:{args.port}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())